@@ -1,33 +1,62 @@
 import logging
 import os
 import pathlib
+import sys
+import time
+import uuid
+from typing import Optional
 
 from dotenv import load_dotenv
-from livekit import agents
+from livekit import agents, rtc
 from livekit.agents import (
     NOT_GIVEN,
     Agent,
     AgentFalseInterruptionEvent,
-    AgentSession,
+    AgentStateChangedEvent,
     JobContext,
     JobProcess,
     MetricsCollectedEvent,
     RoomInputOptions,
     RunContext,
+    UserStateChangedEvent,
     WorkerOptions,
     cli,
     metrics,
     ChatContext,
 )
 from livekit.agents.llm import function_tool
-from livekit.plugins import cartesia, deepgram, noise_cancellation, openai, silero #, bithuman # groq,
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
-from recording import RecordingManager
+from livekit.agents.voice import SpeechHandle
+from livekit.agents.voice.agent_activity import _SpeechHandleContextVar
+from livekit.plugins import noise_cancellation
+from response_cache import PendingResponse, ResponseCache, content_hash
+from metrics_store import MetricsStore, MetricsWriter, db_path, metric_row, turn_row
+from recording import RecordingManager, create_s3_client, recording_enabled
+from endpointing import load_endpointing_config
+from pipeline import (
+    CASCADED,
+    REALTIME,
+    PipelineMetrics,
+    active_modes,
+    build_session,
+    estimate_cost,
+    load_pipeline_config,
+    load_plugins,
+    models_names,
+    select_mode,
+)
 
 logger = logging.getLogger("agent")
 
 load_dotenv(".env.local")
 
+# `agent.py report` only reads the metrics store
+REPORT_COMMAND = sys.argv[1:2] == ["report"]
+
+# Only import the plugins (and download their models) for the configured pipeline
+pipeline_config = load_pipeline_config()
+if not REPORT_COMMAND:
+    load_plugins(pipeline_config)
+
 
 # Helper function to load files from a directory
 async def load_files_from_directory(directory_path):
@@ -93,9 +122,158 @@ default_instructions = None
 default_knowledge = None
 
 
+# Text of the message the agent is replying to, if it is the user's
+def last_user_message(chat_ctx: ChatContext) -> Optional[str]:
+    # after a tool call the agent replies to the tool output, not to the user again
+    if not chat_ctx.items:
+        return None
+    item = chat_ctx.items[-1]
+    if item.type != "message" or item.role != "user":
+        return None
+    return item.text_content
+
+
+# Text of the assistant turn the user's last message replies to. The first user
+# message replies to the greeting, which addresses the caller by name, so it gets
+# an empty context to share cache entries across callers
+def previous_assistant_message(chat_ctx: ChatContext) -> str:
+    messages = [item for item in chat_ctx.items if item.type == "message"]
+    if not any(item.role == "user" for item in messages[:-1]):
+        return ""
+    for item in reversed(messages[:-1]):
+        if item.role == "assistant":
+            return item.text_content or ""
+    return ""
+
+
+# The speech handle of the reply being generated. livekit runs a reply's llm and tts
+# nodes inside its speech handle's task but only exposes the handle through this
+# context var, which it also uses to tag metrics with their speech_id
+def current_speech_handle() -> Optional[SpeechHandle]:
+    return _SpeechHandleContextVar.get(None)
+
+
 class Assistant(Agent):
-    def __init__(self, chat_ctx: ChatContext, instructions: str) -> None:
+    def __init__(
+        self,
+        chat_ctx: ChatContext,
+        instructions: str,
+        response_cache: Optional[ResponseCache] = None,
+    ) -> None:
         super().__init__(chat_ctx=chat_ctx, instructions=instructions)
+        self._response_cache = response_cache
+        # keyed by speech handle, preemptive generations can overlap the next one
+        self._pending_responses: dict[Optional[SpeechHandle], PendingResponse] = {}
+        # names of the participants in the room, replies mentioning them are never cached
+        self.user_names: set[str] = set()
+
+    # With the response cache enabled, answer repeated questions with the cached text
+    # here and replay the cached audio in tts_node, skipping the LLM and TTS round trips
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        handle = current_speech_handle()
+        # generations that were cancelled before reaching tts_node
+        for done in [h for h in self._pending_responses if h is not None and h.done()]:
+            del self._pending_responses[done]
+        self._pending_responses.pop(handle, None)
+
+        transcript = last_user_message(chat_ctx) if self._response_cache is not None else None
+        if not transcript or not self._response_cache.accepts(transcript):
+            async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+                yield chunk
+            return
+
+        context = previous_assistant_message(chat_ctx)
+        pending = PendingResponse(transcript, context, time.perf_counter())
+        self._pending_responses[handle] = pending
+        pending.hit = self._response_cache.lookup(transcript, context)
+        if pending.hit:
+            logger.info(f"Response cache hit for: {transcript[:50]}")
+            yield pending.hit.text
+            return
+
+        has_tool_calls = False
+        async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+            if isinstance(chunk, str):
+                pending.text += chunk
+            elif chunk.delta:
+                pending.text += chunk.delta.content or ""
+                has_tool_calls = has_tool_calls or bool(chunk.delta.tool_calls)
+            yield chunk
+        pending.complete = not has_tool_calls
+
+    async def tts_node(self, text, model_settings):
+        if self._response_cache is None:
+            async for frame in Agent.default.tts_node(self, text, model_settings):
+                yield frame
+            return
+
+        # llm_node has started producing this reply once its first text arrives
+        handle = current_speech_handle()
+        text = text.__aiter__()
+        try:
+            first_text = await text.__anext__()
+        except StopAsyncIteration:
+            self._pending_responses.pop(handle, None)
+            return
+        pending = self._pending_responses.pop(handle, None)
+        cache = self._response_cache
+
+        if pending and pending.hit:
+            hit = pending.hit
+            latency_saved = hit.latency - (time.perf_counter() - pending.started_at)
+            self._when_played(handle, lambda interrupted: cache.record_hit(latency_saved))
+            for frame in hit.frames:
+                yield frame
+            async for _ in text:
+                pass
+            return
+
+        async def replayed_text():
+            yield first_text
+            async for chunk in text:
+                yield chunk
+
+        frames = []
+
+        def on_played(interrupted: bool) -> None:
+            cache.record_miss()
+            # only cache replies that were generated and spoken in full
+            if pending.complete and not interrupted:
+                cache.store(
+                    pending.transcript,
+                    pending.text,
+                    frames,
+                    first_frame_at - pending.started_at,
+                    context=pending.context,
+                    private_terms=self.user_names,
+                )
+
+        first_frame_at = None
+        try:
+            async for frame in Agent.default.tts_node(self, replayed_text(), model_settings):
+                if first_frame_at is None:
+                    first_frame_at = time.perf_counter()
+                frames.append(frame)
+                yield frame
+        finally:
+            # also when an interruption cancels the synthesis
+            if pending and first_frame_at is not None:
+                self._when_played(handle, on_played)
+
+    # Calls `callback(interrupted)` once the reply is done playing. Discarded
+    # preemptive generations are never scheduled and never count.
+    @staticmethod
+    def _when_played(handle: Optional[SpeechHandle], callback) -> None:
+        def on_done(h: SpeechHandle) -> None:
+            if h.scheduled:
+                callback(h.interrupted)
+
+        if handle is None:
+            callback(False)
+        elif handle.done():
+            on_done(handle)
+        else:
+            handle.add_done_callback(on_done)
 
     # # all functions annotated with @function_tool will be passed to the LLM when this
     # # agent is active
@@ -115,7 +293,28 @@ class Assistant(Agent):
 
 
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    endpointing_config = load_endpointing_config()
+    proc.userdata["endpointing"] = endpointing_config
+    proc.userdata["vad"] = None
+    if CASCADED in active_modes(pipeline_config):
+        from livekit.plugins import silero
+
+        proc.userdata["vad"] = silero.VAD.load(**endpointing_config.vad_options())
+
+    proc.userdata["response_cache"] = ResponseCache.from_env()
+
+    proc.userdata["metrics_store"] = None
+    try:
+        proc.userdata["metrics_store"] = MetricsStore(db_path())
+    except Exception as e:
+        logger.error(f"Error opening metrics store: {e}")
+
+    proc.userdata["s3_client"] = None
+    if recording_enabled():
+        try:
+            proc.userdata["s3_client"] = create_s3_client()
+        except Exception as e:
+            logger.error(f"Error creating S3 client: {e}")
 
 
 async def entrypoint(ctx: JobContext):
@@ -141,45 +340,20 @@ async def entrypoint(ctx: JobContext):
     if knowledge_content:
         logger.info(f"Knowledge last part: {knowledge_content[-50:]}...")
     
-    modelsNames = ["gpt-4o-mini", "whisper-1", "gpt-4o-mini-tts"]
-
-    # Set up a voice AI pipeline using OpenAI, Cartesia, Deepgram, and the LiveKit turn detector
-    session = AgentSession(
-        # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
-        # See all providers at https://docs.livekit.io/agents/integrations/llm/
-        llm=openai.LLM(model=modelsNames[0]),
-        # llm=groq.LLM(
-        #     model="llama-3.1-8b-instant"
-        # ),
-        # llm=openai.LLM.with_ollama(
-        #     model="llama3.1",
-        #     base_url="http://localhost:11434/v1",
-        # ),
-        # llm=openai.LLM.with_together(
-        #     model="meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
-        # ),
-        # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
-        # See all providers at https://docs.livekit.io/agents/integrations/stt/
-        # stt=deepgram.STT(model="nova-3", language="multi"),
-        # stt=groq.STT(model='whisper-large-v3-turbo', language="multi"),
-        stt=openai.STT(model=modelsNames[1], language="he"),
-        # Text-to-speech (TTS) is your agent's voice, turning the LLM's text into speech that the user can hear
-        # See all providers at https://docs.livekit.io/agents/integrations/tts/
-        # tts=cartesia.TTS(voice="6f84f4b8-58a2-430c-8c79-688dad597532"),
-        tts=openai.TTS(model=modelsNames[2]),
-        # VAD and turn detection are used to determine when the user is speaking and when the agent should respond
-        # See more at https://docs.livekit.io/agents/build/turns
-        turn_detection=MultilingualModel(),
+    # Pick the cascaded STT -> LLM -> TTS pipeline or the realtime speech-to-speech one for this room
+    pipeline_mode = select_mode(ctx.room.name, pipeline_config)
+    ctx.log_context_fields["pipeline_mode"] = pipeline_mode
+    logger.info(f"Using {pipeline_mode} pipeline")
+
+    modelsNames = models_names(pipeline_mode, pipeline_config)
+    endpointing_config = ctx.proc.userdata["endpointing"]
+
+    session = build_session(
+        pipeline_mode,
+        pipeline_config,
         vad=ctx.proc.userdata["vad"],
-        # allow the LLM to generate a response while waiting for the end of turn
-        # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
-        preemptive_generation=True,
+        endpointing_config=endpointing_config,
     )
-    # # To use a realtime model instead of a voice pipeline, use the following session setup instead:
-    # session = AgentSession(
-    #     # See all providers at https://docs.livekit.io/agents/integrations/realtime/
-    #     llm=openai.realtime.RealtimeModel(voice="marin")
-    # )
 
     # if knowledge_content:
     #     # This will need to be handled differently depending on your specific needs
@@ -194,18 +368,77 @@ async def entrypoint(ctx: JobContext):
         logger.info("false positive interruption, resuming")
         session.generate_reply(instructions=ev.extra_instructions or NOT_GIVEN)
 
+    # The response cache sits in front of the LLM and TTS, so only the cascaded pipeline uses it
+    response_cache = ctx.proc.userdata["response_cache"] if pipeline_mode == CASCADED else None
+    if response_cache is not None:
+        response_cache.set_content_hash(content_hash(instructions, knowledge_content, *modelsNames))
+
     # Metrics collection, to measure pipeline performance
     # For more information, see https://docs.livekit.io/agents/build/metrics/
     usage_collector = metrics.UsageCollector()
 
+    # Persist every metrics event and turn to the local metrics store, in batches
+    session_id = uuid.uuid4().hex
+    session_started_at = time.time()
+    recording_id = None
+    metrics_store = ctx.proc.userdata["metrics_store"]
+    metrics_writer = MetricsWriter(metrics_store) if metrics_store else None
+
+    def _on_turn(latency: float, cost: float):
+        if metrics_writer:
+            metrics_writer.add(turn_row(session_id, latency, cost))
+
+    # per-turn latency and cost, tagged by pipeline mode for A/B comparison
+    pipeline_metrics = PipelineMetrics(pipeline_mode, pipeline_config, on_turn=_on_turn)
+
+    def _session_row(ended_at: float) -> tuple:
+        return (
+            session_id,
+            ctx.room.name,
+            *modelsNames,
+            pipeline_mode,
+            recording_id,
+            session_started_at,
+            ended_at,
+            pipeline_metrics.cost,
+        )
+
+    async def save_metrics():
+        pipeline_metrics.close()
+        if metrics_writer:
+            await metrics_writer.aclose(_session_row(time.time()))
+
+    # the session row is written up front and updated on shutdown, so the session's
+    # metrics stay visible to the report even if the job dies before it ends
+    if metrics_writer:
+        await metrics_writer.start(_session_row(session_started_at))
+    ctx.add_shutdown_callback(save_metrics)
+
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
         metrics.log_metrics(ev.metrics)
         usage_collector.collect(ev.metrics)
+        pipeline_metrics.collect(ev.metrics)
+        if metrics_writer:
+            metrics_writer.add(
+                metric_row(session_id, ev.metrics, estimate_cost(ev.metrics, pipeline_config))
+            )
+
+    @session.on("user_state_changed")
+    def _on_user_state_changed(ev: UserStateChangedEvent):
+        pipeline_metrics.user_state_changed(ev)
+
+    @session.on("agent_state_changed")
+    def _on_agent_state_changed(ev: AgentStateChangedEvent):
+        pipeline_metrics.agent_state_changed(ev)
 
     async def log_usage():
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
+        pipeline_metrics.close()
+        logger.info(f"Pipeline: {pipeline_metrics.summary()}")
+        if response_cache is not None:
+            logger.info(f"Response cache: {response_cache.stats.to_dict()}")
 
     ctx.add_shutdown_callback(log_usage)
 
@@ -224,11 +457,18 @@ async def entrypoint(ctx: JobContext):
     # Create a chat context with the knowledge content
     chat_ctx = ChatContext()
     if knowledge_content:
-        chat_ctx.add_message(role="assistant", content=f"Reference information:\n{knowledge_content}")
+        if pipeline_mode == REALTIME:
+            # the realtime API truncates old conversation items once its context fills up,
+            # but always keeps the instructions, so the knowledge goes there
+            instructions = f"{instructions}\n\nReference information:\n{knowledge_content}"
+        else:
+            chat_ctx.add_message(role="assistant", content=f"Reference information:\n{knowledge_content}")
+
+    assistant = Assistant(chat_ctx=chat_ctx, instructions=instructions, response_cache=response_cache)
 
     # Start the session
     await session.start(
-        agent=Assistant(chat_ctx=chat_ctx, instructions=instructions),
+        agent=assistant,
         room=ctx.room,
         room_input_options=RoomInputOptions(
             noise_cancellation=noise_cancellation.BVC(),
@@ -238,15 +478,25 @@ async def entrypoint(ctx: JobContext):
     # Join the room and connect to the user
     await ctx.connect()
 
+    # the greeting addresses the user by name, keep their name out of the response cache
+    def _remember_user(participant: rtc.RemoteParticipant):
+        assistant.user_names.update(name for name in (participant.name, participant.identity) if name)
+
+    for participant in ctx.room.remote_participants.values():
+        _remember_user(participant)
+    ctx.room.on("participant_connected", _remember_user)
+
     # Initialize recording manager
-    recording_manager = RecordingManager()
-    recording_id = None
+    recording_manager = RecordingManager(s3_client=ctx.proc.userdata["s3_client"])
 
     try:
         # Start recording the room
         recording_id = await recording_manager.start_recording(ctx.room.name, modelsNames)
         if recording_id:
             logger.info(f"Started recording with ID: {recording_id}")
+            # the row written at start has no recording ID yet
+            if metrics_writer:
+                await metrics_writer.update_session(_session_row(session_started_at))
         else:
             logger.warning("Failed to start recording")
     except Exception as e:
@@ -267,4 +517,9 @@ async def entrypoint(ctx: JobContext):
     )
     
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
+    if REPORT_COMMAND:
+        import metrics_report
+
+        metrics_report.main(sys.argv[2:])
+    else:
+        cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
@@ -0,0 +1,60 @@
+import pathlib
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import settings
+
+DEFAULT_CONFIG_PATH = pathlib.Path("config") / "endpointing.json"
+
+
+@dataclass
+class EndpointingConfig:
+    """Turn-taking parameters shared by the session builder and the offline benchmark.
+
+    The defaults match the livekit-agents / silero defaults, so a missing config
+    file keeps the agent behaving exactly as before.
+    """
+
+    # silero.VAD.load() options
+    activation_threshold: float = 0.5
+    min_silence_duration: float = 0.4
+    # AgentSession options
+    min_endpointing_delay: float = 0.4
+    max_endpointing_delay: float = 6.0
+    min_interruption_duration: float = 0.5
+    # MultilingualModel override, None keeps the per-language threshold
+    unlikely_threshold: Optional[float] = None
+
+    def vad_options(self) -> dict:
+        return {
+            "activation_threshold": self.activation_threshold,
+            "min_silence_duration": self.min_silence_duration,
+        }
+
+    def session_options(self) -> dict:
+        return {
+            "min_endpointing_delay": self.min_endpointing_delay,
+            "max_endpointing_delay": self.max_endpointing_delay,
+            "min_interruption_duration": self.min_interruption_duration,
+        }
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EndpointingConfig":
+        return settings.dataclass_from_dict(cls, data, "endpointing")
+
+
+def config_path() -> pathlib.Path:
+    return settings.config_path("ENDPOINTING_CONFIG", DEFAULT_CONFIG_PATH)
+
+
+def load_endpointing_config(path: Optional[pathlib.Path] = None) -> EndpointingConfig:
+    return settings.load_config(EndpointingConfig, path or config_path(), "endpointing")
+
+
+def save_endpointing_config(
+    config: EndpointingConfig, path: Optional[pathlib.Path] = None
+) -> pathlib.Path:
+    return settings.save_config(config, path or config_path())
@@ -0,0 +1,608 @@
+"""Offline endpointing benchmark.
+
+Replays labeled audio through the same silero VAD + MultilingualModel turn
+detection that the agent session uses, sweeps the endpointing parameters and
+reports the trade-off between end-of-turn latency, premature cut-offs and
+false interruptions.
+
+The manifest is a JSONL file, one labeled recording per line:
+
+    {"audio": "call-01.wav", "language": "he",
+     "words": [{"text": "שלום", "start": 0.42, "end": 0.81}, ...],
+     "turn_ends": [2.35, 9.10]}
+
+`audio` is a mono 16-bit PCM wav (relative to the manifest), `words` are the
+user's words with timings and `turn_ends` are the times at which the user
+actually finished a turn and expected the agent to answer. Any VAD speech
+that overlaps no labeled word is treated as noise.
+
+Usage:
+    uv run src/endpointing_benchmark.py --manifest data/endpointing/manifest.jsonl
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import pathlib
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from livekit.plugins.turn_detector.multilingual import (
+    MultilingualModel,
+    _EUORunnerMultilingual,
+)
+
+from endpointing import EndpointingConfig, config_path, save_endpointing_config
+
+logger = logging.getLogger("endpointing-benchmark")
+
+# slack allowed between a VAD end of speech and the labeled turn end
+LABEL_TOLERANCE = 0.25
+FRAME_DURATION = 0.01
+
+
+@dataclass
+class Word:
+    text: str
+    start: float
+    end: float
+
+
+@dataclass
+class Sample:
+    audio: pathlib.Path
+    language: str
+    words: list[Word]
+    turn_ends: list[float]
+
+
+@dataclass
+class Pause:
+    """A VAD speech segment and what the turn detector thought when it ended."""
+
+    speech_start: float
+    speech_end: float
+    vad_fired: float
+    # user transcript of the current turn when the speech ended
+    text: str
+    eou_probability: Optional[float]
+    # False when the segment overlaps no labeled word, i.e. it is noise
+    has_words: bool
+
+
+@dataclass
+class Replay:
+    sample_index: int
+    activation_threshold: float
+    min_silence_duration: float
+    pauses: list[Pause]
+    default_unlikely_threshold: Optional[float]
+
+
+@dataclass
+class BenchmarkResult:
+    config: EndpointingConfig
+    turns: int = 0
+    latencies: list[float] = field(default_factory=list)
+    premature: int = 0
+    missed: int = 0
+    false_interruptions: int = 0
+
+    @property
+    def endpoints(self) -> int:
+        return len(self.latencies) + self.premature
+
+    @property
+    def median_latency(self) -> float:
+        return _percentile(self.latencies, 50)
+
+    @property
+    def p90_latency(self) -> float:
+        return _percentile(self.latencies, 90)
+
+    @property
+    def premature_rate(self) -> float:
+        return self.premature / self.endpoints if self.endpoints else 0.0
+
+    @property
+    def false_interruption_rate(self) -> float:
+        return self.false_interruptions / self.turns if self.turns else 0.0
+
+    @property
+    def missed_rate(self) -> float:
+        return self.missed / self.turns if self.turns else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "config": self.config.to_dict(),
+            "turns": self.turns,
+            "median_latency": self.median_latency,
+            "p90_latency": self.p90_latency,
+            "premature_rate": self.premature_rate,
+            "false_interruption_rate": self.false_interruption_rate,
+            "missed_rate": self.missed_rate,
+        }
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return math.inf
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * percent / 100
+    lower, upper = math.floor(index), math.ceil(index)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (index - lower)
+
+
+def load_manifest(manifest_path: pathlib.Path) -> list[Sample]:
+    samples = []
+    with open(manifest_path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            samples.append(
+                Sample(
+                    audio=manifest_path.parent / entry["audio"],
+                    language=entry.get("language", "he"),
+                    words=[Word(**word) for word in entry.get("words", [])],
+                    turn_ends=sorted(entry.get("turn_ends", [])),
+                )
+            )
+    return samples
+
+
+def turn_text(sample: Sample, speech_end: float) -> str:
+    """Transcript of the user's current turn up to `speech_end`."""
+    previous_ends = [t for t in sample.turn_ends if t < speech_end - LABEL_TOLERANCE]
+    turn_start = previous_ends[-1] if previous_ends else -math.inf
+    return " ".join(
+        word.text
+        for word in sample.words
+        if word.start >= turn_start and word.end <= speech_end + LABEL_TOLERANCE
+    )
+
+
+def _overlaps_words(sample: Sample, start: float, end: float) -> bool:
+    return any(word.start < end and word.end > start for word in sample.words)
+
+
+# --- worker side: VAD and turn detector replay ---
+
+
+class _LocalInferenceExecutor:
+    """Runs the turn detector model in-process instead of in the job's inference executor."""
+
+    def __init__(self, runner) -> None:
+        self._runner = runner
+
+    async def do_inference(self, method: str, data: bytes) -> Optional[bytes]:
+        return self._runner.run(data)
+
+
+class OfflineMultilingualModel(MultilingualModel):
+    """MultilingualModel that runs its model in this process.
+
+    MultilingualModel takes its inference executor from the job context, which
+    does not exist offline, so this passes a local one to EOUModelBase instead.
+    """
+
+    def __init__(self, *, unlikely_threshold: Optional[float] = None) -> None:
+        runner = _EUORunnerMultilingual()
+        runner.initialize()
+        super(MultilingualModel, self).__init__(
+            model_type="multilingual",
+            inference_executor=_LocalInferenceExecutor(runner),
+            unlikely_threshold=unlikely_threshold,
+        )
+
+
+_turn_detector: Optional[OfflineMultilingualModel] = None
+
+
+def _offline_turn_detector() -> OfflineMultilingualModel:
+    # loaded once per pool worker and reused across its samples
+    global _turn_detector
+    if _turn_detector is None:
+        _turn_detector = OfflineMultilingualModel()
+    return _turn_detector
+
+
+def _read_wav(path: pathlib.Path) -> tuple[bytes, int]:
+    with wave.open(str(path), "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path} must be mono 16-bit PCM")
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+async def _vad_segments(
+    sample: Sample, activation_threshold: float, min_silence_duration: float
+) -> list[tuple[float, float, float]]:
+    """Returns (speech_start, speech_end, vad_fired) for every VAD speech segment."""
+    from livekit import rtc
+    from livekit.agents import vad
+    from livekit.plugins import silero
+
+    pcm, sample_rate = _read_wav(sample.audio)
+    duration = len(pcm) / 2 / sample_rate
+
+    detector = silero.VAD.load(
+        activation_threshold=activation_threshold,
+        min_silence_duration=min_silence_duration,
+    )
+    stream = detector.stream()
+    samples_per_frame = int(sample_rate * FRAME_DURATION)
+    frame_bytes = samples_per_frame * 2
+    for offset in range(0, len(pcm) - frame_bytes + 1, frame_bytes):
+        stream.push_frame(
+            rtc.AudioFrame(
+                data=pcm[offset : offset + frame_bytes],
+                sample_rate=sample_rate,
+                num_channels=1,
+                samples_per_channel=samples_per_frame,
+            )
+        )
+    stream.end_input()
+
+    segments = []
+    speech_start = None
+    async for ev in stream:
+        if ev.type == vad.VADEventType.START_OF_SPEECH:
+            speech_start = ev.timestamp - ev.speech_duration
+        elif ev.type == vad.VADEventType.END_OF_SPEECH and speech_start is not None:
+            segments.append(
+                (speech_start, ev.timestamp - ev.silence_duration, ev.timestamp)
+            )
+            speech_start = None
+    await stream.aclose()
+
+    if speech_start is not None:
+        segments.append((speech_start, duration, duration))
+    return segments
+
+
+async def _replay(
+    sample: Sample,
+    activation_threshold: float,
+    min_silence_duration: float,
+    use_turn_detector: bool,
+) -> tuple[list[Pause], Optional[float]]:
+    from livekit.agents import ChatContext
+
+    segments = await _vad_segments(sample, activation_threshold, min_silence_duration)
+
+    turn_detector, default_threshold, supported = None, None, False
+    if use_turn_detector:
+        turn_detector = _offline_turn_detector()
+        default_threshold = await turn_detector.unlikely_threshold(sample.language)
+        supported = await turn_detector.supports_language(sample.language)
+    if use_turn_detector and not supported:
+        logger.warning(
+            f"Turn detector does not support language {sample.language}, "
+            "endpointing will rely on VAD and min_endpointing_delay only"
+        )
+
+    pauses = []
+    for speech_start, speech_end, vad_fired in segments:
+        text = turn_text(sample, speech_end)
+        probability = None
+        if text and supported:
+            chat_ctx = ChatContext()
+            chat_ctx.add_message(role="user", content=text)
+            probability = await turn_detector.predict_end_of_turn(chat_ctx)
+        pauses.append(
+            Pause(
+                speech_start=speech_start,
+                speech_end=speech_end,
+                vad_fired=vad_fired,
+                text=text,
+                eou_probability=probability,
+                has_words=_overlaps_words(sample, speech_start, speech_end),
+            )
+        )
+    return pauses, default_threshold
+
+
+def replay_sample(task: tuple[int, Sample, float, float, bool]) -> Replay:
+    (
+        sample_index,
+        sample,
+        activation_threshold,
+        min_silence_duration,
+        use_turn_detector,
+    ) = task
+    pauses, default_threshold = asyncio.run(
+        _replay(sample, activation_threshold, min_silence_duration, use_turn_detector)
+    )
+    return Replay(
+        sample_index=sample_index,
+        activation_threshold=activation_threshold,
+        min_silence_duration=min_silence_duration,
+        pauses=pauses,
+        default_unlikely_threshold=default_threshold,
+    )
+
+
+# --- scoring ---
+
+
+def score_replay(
+    sample: Sample,
+    replay: Replay,
+    config: EndpointingConfig,
+    result: BenchmarkResult,
+) -> None:
+    """Simulates AgentSession endpointing over one replay and adds it to `result`.
+
+    Mirrors livekit's audio recognition: after the VAD end of speech the agent
+    waits min_endpointing_delay, or max_endpointing_delay when the turn detector
+    probability is below the unlikely threshold, and a new start of speech
+    before then cancels the endpoint.
+    """
+    pauses = replay.pauses
+    threshold = config.unlikely_threshold
+    if threshold is None:
+        threshold = replay.default_unlikely_threshold
+
+    answered: dict[float, float] = {}
+    for i, pause in enumerate(pauses):
+        if not pause.text:
+            # no transcript yet, the session never runs end of turn detection
+            continue
+
+        delay = config.min_endpointing_delay
+        if (
+            pause.eou_probability is not None
+            and threshold is not None
+            and pause.eou_probability < threshold
+        ):
+            delay = config.max_endpointing_delay
+        endpoint = max(pause.vad_fired, pause.speech_end + delay)
+
+        next_start = pauses[i + 1].speech_start if i + 1 < len(pauses) else math.inf
+        if next_start < endpoint:
+            continue
+
+        turn_end = next(
+            (t for t in sample.turn_ends if t >= pause.speech_end - LABEL_TOLERANCE),
+            None,
+        )
+        if turn_end is None or turn_end - pause.speech_end > LABEL_TOLERANCE:
+            result.premature += 1
+        elif turn_end not in answered:
+            answered[turn_end] = endpoint
+            result.latencies.append(max(endpoint - turn_end, 0.0))
+
+    result.turns += len(sample.turn_ends)
+    result.missed += len(sample.turn_ends) - len(answered)
+
+    # noise picked up by the VAD while the agent is answering interrupts it
+    for turn_end, endpoint in answered.items():
+        next_word = next(
+            (word.start for word in sample.words if word.start > turn_end),
+            math.inf,
+        )
+        result.false_interruptions += sum(
+            1
+            for pause in pauses
+            if endpoint < pause.speech_start < next_word
+            and not pause.has_words
+            and pause.speech_end - pause.speech_start
+            >= config.min_interruption_duration
+        )
+
+
+def sweep_configs(
+    activation_thresholds: list[float],
+    min_silence_durations: list[float],
+    min_delays: list[float],
+    max_delays: list[float],
+    unlikely_thresholds: list[Optional[float]],
+) -> list[EndpointingConfig]:
+    return [
+        EndpointingConfig(
+            activation_threshold=activation,
+            min_silence_duration=silence,
+            min_endpointing_delay=min_delay,
+            max_endpointing_delay=max_delay,
+            unlikely_threshold=unlikely,
+        )
+        for activation, silence, min_delay, max_delay, unlikely in itertools.product(
+            activation_thresholds,
+            min_silence_durations,
+            min_delays,
+            max_delays,
+            unlikely_thresholds,
+        )
+        if max_delay >= min_delay
+    ]
+
+
+def run_benchmark(
+    samples: list[Sample],
+    configs: list[EndpointingConfig],
+    workers: Optional[int] = None,
+    use_turn_detector: bool = True,
+) -> list[BenchmarkResult]:
+    """Scores every config over every sample.
+
+    Without the turn detector, endpointing relies on the VAD and
+    min_endpointing_delay only, as in the agent for unsupported languages.
+    """
+    # the VAD and turn detector replay is the expensive part and only depends on
+    # the VAD options, so it runs once per (sample, VAD options) in the pool
+    vad_options = sorted(
+        {(c.activation_threshold, c.min_silence_duration) for c in configs}
+    )
+    tasks = [
+        (index, sample, activation, silence, use_turn_detector)
+        for index, sample in enumerate(samples)
+        for activation, silence in vad_options
+    ]
+    logger.info(
+        f"Replaying {len(samples)} samples with {len(vad_options)} VAD settings"
+    )
+
+    replays: dict[tuple[float, float], list[Replay]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for replay in pool.map(replay_sample, tasks):
+            key = (replay.activation_threshold, replay.min_silence_duration)
+            replays.setdefault(key, []).append(replay)
+
+    results = []
+    for config in configs:
+        result = BenchmarkResult(config=config)
+        for replay in replays[
+            (config.activation_threshold, config.min_silence_duration)
+        ]:
+            score_replay(samples[replay.sample_index], replay, config, result)
+        results.append(result)
+    return results
+
+
+def pareto_front(results: list[BenchmarkResult]) -> list[BenchmarkResult]:
+    def objectives(r: BenchmarkResult) -> tuple[float, float, float, float]:
+        return (
+            r.median_latency,
+            r.premature_rate,
+            r.false_interruption_rate,
+            r.missed_rate,
+        )
+
+    def dominates(a: BenchmarkResult, b: BenchmarkResult) -> bool:
+        oa, ob = objectives(a), objectives(b)
+        return all(x <= y for x, y in zip(oa, ob)) and oa != ob
+
+    front = [r for r in results if not any(dominates(o, r) for o in results)]
+    return sorted(front, key=lambda r: r.median_latency)
+
+
+def recommend(
+    results: list[BenchmarkResult],
+    max_premature_rate: float,
+    max_false_interruption_rate: float,
+    max_missed_rate: float,
+) -> BenchmarkResult:
+    # latencies only cover answered turns, so without a missed budget a config
+    # that never answers its slow turns would look fastest
+    acceptable = [
+        r
+        for r in results
+        if r.premature_rate <= max_premature_rate
+        and r.false_interruption_rate <= max_false_interruption_rate
+        and r.missed_rate <= max_missed_rate
+    ]
+    if acceptable:
+        return min(
+            acceptable, key=lambda r: (r.median_latency, r.p90_latency, r.missed_rate)
+        )
+
+    logger.warning(
+        "No config meets the error budgets, picking the one with the fewest errors"
+    )
+    return min(
+        results,
+        key=lambda r: (
+            r.premature_rate + r.false_interruption_rate + r.missed_rate,
+            r.median_latency,
+        ),
+    )
+
+
+def _format_row(result: BenchmarkResult) -> str:
+    c = result.config
+    unlikely = (
+        "default" if c.unlikely_threshold is None else f"{c.unlikely_threshold:.2f}"
+    )
+    return (
+        f"{c.activation_threshold:>6.2f} {c.min_silence_duration:>7.2f} "
+        f"{c.min_endpointing_delay:>7.2f} {c.max_endpointing_delay:>7.2f} {unlikely:>8} | "
+        f"{result.median_latency:>7.2f} {result.p90_latency:>7.2f} "
+        f"{result.premature_rate:>9.1%} {result.false_interruption_rate:>9.1%} "
+        f"{result.missed_rate:>7.1%}"
+    )
+
+
+def _parse_floats(value: str) -> list[float]:
+    return [float(v) for v in value.split(",") if v]
+
+
+def _parse_thresholds(value: str) -> list[Optional[float]]:
+    return [None if v == "default" else float(v) for v in value.split(",") if v]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--manifest", type=pathlib.Path, required=True)
+    parser.add_argument(
+        "--activation-thresholds", type=_parse_floats, default="0.35,0.5,0.65"
+    )
+    parser.add_argument(
+        "--min-silence-durations", type=_parse_floats, default="0.25,0.4,0.55"
+    )
+    parser.add_argument("--min-delays", type=_parse_floats, default="0.2,0.4,0.6,0.8")
+    parser.add_argument("--max-delays", type=_parse_floats, default="1.5,3.0,6.0")
+    parser.add_argument(
+        "--unlikely-thresholds",
+        type=_parse_thresholds,
+        default="default",
+        help="comma separated, 'default' keeps the turn detector's per-language threshold",
+    )
+    parser.add_argument("--max-premature-rate", type=float, default=0.05)
+    parser.add_argument("--max-false-interruption-rate", type=float, default=0.05)
+    parser.add_argument("--max-missed-rate", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--no-turn-detector",
+        dest="use_turn_detector",
+        action="store_false",
+        help="score VAD-only endpointing, without the multilingual turn detector",
+    )
+    parser.add_argument("--output", type=pathlib.Path, default=config_path())
+    parser.add_argument(
+        "--report", type=pathlib.Path, help="write every result as JSON"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    samples = load_manifest(args.manifest)
+    configs = sweep_configs(
+        args.activation_thresholds,
+        args.min_silence_durations,
+        args.min_delays,
+        args.max_delays,
+        args.unlikely_thresholds,
+    )
+    results = run_benchmark(
+        samples, configs, workers=args.workers, use_turn_detector=args.use_turn_detector
+    )
+
+    print(
+        "   vad silence min_eou max_eou unlikely |  median     p90 premature falseintr  missed"
+    )
+    for result in pareto_front(results):
+        print(_format_row(result))
+
+    best = recommend(
+        results,
+        args.max_premature_rate,
+        args.max_false_interruption_rate,
+        args.max_missed_rate,
+    )
+    print(f"\nRecommended:\n{_format_row(best)}")
+    path = save_endpointing_config(best.config, args.output)
+    print(f"Saved to {path}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump([r.to_dict() for r in results], file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
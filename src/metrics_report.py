@@ -0,0 +1,161 @@
+"""Latency, token and cost report over the sessions in the metrics store.
+
+Usage:
+    uv run python src/agent.py report --since 2026-10-01 --until 2026-10-08
+"""
+
+import argparse
+import pathlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from metrics_store import MetricsStore, db_path
+
+PERCENTILES = (50, 90, 99)
+
+# Both queries skip sessions still running or that died before writing their end
+# (the row written when a session starts has ended_at == started_at and no cost)
+
+# Nearest-rank percentiles of the per-turn latency for each model triple, computed
+# in SQLite so only one row per model triple leaves the database
+LATENCY_SQL = """
+WITH scope AS (
+    SELECT id, llm_model, stt_model, tts_model
+    FROM sessions
+    WHERE started_at >= ? AND started_at < ? AND ended_at > started_at {room_filter}
+),
+turns AS (
+    SELECT
+        s.llm_model, s.stt_model, s.tts_model, m.latency,
+        ROW_NUMBER() OVER (
+            PARTITION BY s.llm_model, s.stt_model, s.tts_model ORDER BY m.latency
+        ) AS rn,
+        COUNT(*) OVER (PARTITION BY s.llm_model, s.stt_model, s.tts_model) AS n
+    -- CROSS JOIN keeps SQLite from scanning metrics first: find the sessions in
+    -- range by started_at, then their turns through metrics_session_kind
+    FROM scope s
+    CROSS JOIN metrics m ON m.session_id = s.id AND m.kind = 'turn'
+)
+SELECT
+    llm_model, stt_model, tts_model, COUNT(*),
+    {percentile_columns}
+FROM turns
+GROUP BY llm_model, stt_model, tts_model
+"""
+
+SESSIONS_SQL = """
+WITH scope AS (
+    SELECT id, llm_model, stt_model, tts_model, ended_at - started_at AS duration, cost
+    FROM sessions
+    WHERE started_at >= ? AND started_at < ? AND ended_at > started_at {room_filter}
+)
+SELECT
+    s.llm_model, s.stt_model, s.tts_model,
+    COUNT(*), SUM(s.duration), AVG(s.cost),
+    SUM((
+        SELECT COALESCE(SUM(m.prompt_tokens + m.completion_tokens), 0)
+        FROM metrics m
+        WHERE m.session_id = s.id AND m.kind IN ('llm', 'realtime')
+    ))
+FROM scope s
+GROUP BY s.llm_model, s.stt_model, s.tts_model
+"""
+
+
+def build_report(
+    store: MetricsStore,
+    since: datetime,
+    until: datetime,
+    room: Optional[str] = None,
+) -> list[dict]:
+    params: tuple = (since.timestamp(), until.timestamp())
+    room_filter = ""
+    if room:
+        room_filter = "AND room = ?"
+        params += (room,)
+
+    percentile_columns = ",\n    ".join(
+        f"MIN(CASE WHEN rn >= {p / 100} * n THEN latency END)" for p in PERCENTILES
+    )
+    latencies = {
+        tuple(row[:3]): row[3:]
+        for row in store.query(
+            LATENCY_SQL.format(
+                room_filter=room_filter, percentile_columns=percentile_columns
+            ),
+            params,
+        )
+    }
+
+    report = []
+    for (
+        llm_model,
+        stt_model,
+        tts_model,
+        sessions,
+        duration,
+        cost,
+        tokens,
+    ) in store.query(SESSIONS_SQL.format(room_filter=room_filter), params):
+        turns, *percentiles = latencies.get(
+            (llm_model, stt_model, tts_model), (0,) + (None,) * len(PERCENTILES)
+        )
+        minutes = (duration or 0) / 60
+        entry = {
+            "models": f"{llm_model}_{stt_model}_{tts_model}",
+            "sessions": sessions,
+            "turns": turns,
+            "tokens_per_minute": tokens / minutes if minutes else 0.0,
+            "cost_per_session": cost or 0.0,
+        }
+        for p, value in zip(PERCENTILES, percentiles):
+            entry[f"p{p}_latency"] = value
+        report.append(entry)
+    return sorted(report, key=lambda e: e["sessions"], reverse=True)
+
+
+def _format_latency(value: Optional[float]) -> str:
+    return f"{value:.2f}s" if value is not None else "-"
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    now = datetime.now()
+    parser = argparse.ArgumentParser(
+        prog="agent.py report", description=__doc__.split("\n\n")[0]
+    )
+    parser.add_argument(
+        "--since", type=datetime.fromisoformat, default=now - timedelta(days=7)
+    )
+    parser.add_argument("--until", type=datetime.fromisoformat, default=now)
+    parser.add_argument("--room", help="only sessions in this room")
+    parser.add_argument("--db", type=pathlib.Path, default=db_path())
+    args = parser.parse_args(argv)
+
+    if not args.db.exists():
+        parser.error(f"metrics database {args.db} does not exist")
+
+    store = MetricsStore(args.db)
+    try:
+        report = build_report(store, args.since, args.until, args.room)
+    finally:
+        store.close()
+
+    print(f"Sessions from {args.since:%Y-%m-%d %H:%M} to {args.until:%Y-%m-%d %H:%M}")
+    header = (
+        f"{'models':<45} {'sessions':>8} {'turns':>6} "
+        + " ".join(f"{'p' + str(p):>7}" for p in PERCENTILES)
+        + f" {'tok/min':>8} {'$/session':>9}"
+    )
+    print(header)
+    for entry in report:
+        print(
+            f"{entry['models']:<45} {entry['sessions']:>8} {entry['turns']:>6} "
+            + " ".join(
+                f"{_format_latency(entry[f'p{p}_latency']):>7}" for p in PERCENTILES
+            )
+            + f" {entry['tokens_per_minute']:>8.0f} {entry['cost_per_session']:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import asyncio
+import contextlib
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from livekit.agents import metrics
+
+logger = logging.getLogger("metrics-store")
+
+DEFAULT_DB_PATH = pathlib.Path("data") / "metrics.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    room TEXT NOT NULL,
+    llm_model TEXT NOT NULL,
+    stt_model TEXT NOT NULL,
+    tts_model TEXT NOT NULL,
+    pipeline_mode TEXT,
+    recording_id TEXT,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    cost REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_started_at ON sessions (started_at);
+CREATE INDEX IF NOT EXISTS sessions_recording ON sessions (recording_id);
+CREATE INDEX IF NOT EXISTS sessions_room ON sessions (room, started_at);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    latency REAL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    audio_duration REAL NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0
+);
+-- covers the per-session latency and token lookups the report runs
+CREATE INDEX IF NOT EXISTS metrics_session_kind
+    ON metrics (session_id, kind, latency, prompt_tokens, completion_tokens);
+"""
+
+INSERT_METRIC = """
+INSERT INTO metrics
+    (session_id, kind, timestamp, latency, prompt_tokens, completion_tokens, audio_duration, cost)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_SESSION = """
+INSERT OR REPLACE INTO sessions
+    (id, room, llm_model, stt_model, tts_model, pipeline_mode, recording_id, started_at, ended_at, cost)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def db_path() -> pathlib.Path:
+    return pathlib.Path(os.getenv("METRICS_DB", str(DEFAULT_DB_PATH)))
+
+
+def metric_row(
+    session_id: str, m: metrics.AgentMetrics, cost: float
+) -> Optional[tuple]:
+    """Maps a livekit metrics event to a `metrics` row, None for events we don't store."""
+    if isinstance(m, metrics.LLMMetrics):
+        return (
+            session_id,
+            "llm",
+            m.timestamp,
+            m.ttft,
+            m.prompt_tokens,
+            m.completion_tokens,
+            0.0,
+            cost,
+        )
+    if isinstance(m, metrics.RealtimeModelMetrics):
+        return (
+            session_id,
+            "realtime",
+            m.timestamp,
+            m.ttft,
+            m.input_tokens,
+            m.output_tokens,
+            0.0,
+            cost,
+        )
+    if isinstance(m, metrics.STTMetrics):
+        return (
+            session_id,
+            "stt",
+            m.timestamp,
+            m.duration,
+            0,
+            0,
+            m.audio_duration,
+            cost,
+        )
+    if isinstance(m, metrics.TTSMetrics):
+        return (session_id, "tts", m.timestamp, m.ttfb, 0, 0, m.audio_duration, cost)
+    if isinstance(m, metrics.EOUMetrics):
+        return (
+            session_id,
+            "eou",
+            m.timestamp,
+            m.end_of_utterance_delay,
+            0,
+            0,
+            0.0,
+            0.0,
+        )
+    return None
+
+
+def turn_row(session_id: str, latency: float, cost: float) -> tuple:
+    return (session_id, "turn", time.time(), latency, 0, 0, 0.0, cost)
+
+
+class MetricsStore:
+    """SQLite store for per-session metrics, in WAL mode so job processes can write concurrently."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def insert_metrics(self, rows: list[tuple]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(INSERT_METRIC, rows)
+
+    def insert_session(self, row: tuple) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(INSERT_SESSION, row)
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class MetricsWriter:
+    """Buffers metric rows from the session's event handlers and writes them in batches.
+
+    `add` only appends to a list, so it is safe to call from the synchronous
+    `metrics_collected` handler; the inserts run in a thread off the event loop.
+    """
+
+    def __init__(
+        self,
+        store: MetricsStore,
+        *,
+        batch_size: int = 100,
+        flush_interval: float = 5.0,
+    ) -> None:
+        self._store = store
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._rows: list[tuple] = []
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self, session_row: tuple) -> None:
+        """Writes the session's row and starts flushing; `aclose` updates the row."""
+        await self._write_session(session_row)
+        self._task = asyncio.create_task(self._run())
+
+    async def update_session(self, session_row: tuple) -> None:
+        """Rewrites the session's row, e.g. once its recording ID is known."""
+        # never overwrite the final row written by `aclose`
+        if not self._closed:
+            await self._write_session(session_row)
+
+    def add(self, row: Optional[tuple]) -> None:
+        if row is None:
+            return
+        self._rows.append(row)
+        if len(self._rows) >= self._batch_size:
+            self._batch_ready.set()
+
+    async def _run(self) -> None:
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._batch_ready.wait(), self._flush_interval)
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        try:
+            await asyncio.to_thread(self._store.insert_metrics, rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} metrics rows: {e}")
+
+    async def aclose(self, session_row: tuple) -> None:
+        self._closed = True
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        await self.flush()
+        await self._write_session(session_row)
+
+    async def _write_session(self, session_row: tuple) -> None:
+        try:
+            await asyncio.to_thread(self._store.insert_session, session_row)
+        except Exception as e:
+            logger.error(f"Error writing session row: {e}")
@@ -0,0 +1,343 @@
+import hashlib
+import importlib
+import logging
+import pathlib
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+from livekit.agents import (
+    AgentSession,
+    AgentStateChangedEvent,
+    UserStateChangedEvent,
+    metrics,
+)
+from livekit.plugins import openai
+
+import settings
+from endpointing import EndpointingConfig
+
+logger = logging.getLogger("pipeline")
+
+CASCADED = "cascaded"
+REALTIME = "realtime"
+MODES = (CASCADED, REALTIME)
+
+DEFAULT_CONFIG_PATH = pathlib.Path("config") / "pipeline.json"
+
+# STT / TTS providers that can be selected in the config
+PROVIDER_PLUGINS = {
+    "openai": "livekit.plugins.openai",
+    "deepgram": "livekit.plugins.deepgram",
+    "cartesia": "livekit.plugins.cartesia",
+}
+
+# Estimated USD prices: per 1M tokens for LLMs, per minute of audio for STT/TTS
+MODEL_PRICES = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-realtime": {
+        "text_input": 4.0,
+        "audio_input": 32.0,
+        "cached_input": 0.40,
+        "text_output": 16.0,
+        "audio_output": 64.0,
+    },
+    "whisper-1": {"minute": 0.006},
+    "gpt-4o-mini-tts": {"minute": 0.015},
+}
+
+
+@dataclass
+class PipelineConfig:
+    # cascaded STT -> LLM -> TTS pipeline
+    llm_model: str = "gpt-4o-mini"
+    stt_model: str = "whisper-1"
+    stt_language: str = "he"
+    stt_provider: str = "openai"
+    tts_model: str = "gpt-4o-mini-tts"
+    tts_provider: str = "openai"
+    tts_voice: Optional[str] = None
+    # speech-to-speech realtime pipeline
+    realtime_model: str = "gpt-realtime"
+    realtime_voice: str = "marin"
+    # share of rooms (0-100) assigned to the realtime pipeline
+    realtime_percentage: float = 0.0
+    # forces every room onto one pipeline, overriding realtime_percentage
+    mode: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PipelineConfig":
+        config = settings.dataclass_from_dict(cls, data, "pipeline")
+        if config.mode is not None and config.mode not in MODES:
+            raise ValueError(
+                f"Unknown pipeline mode {config.mode!r}, expected one of {MODES}"
+            )
+        for kind in ("stt", "tts"):
+            provider = getattr(config, f"{kind}_provider")
+            if provider not in PROVIDER_PLUGINS:
+                raise ValueError(
+                    f"Unknown provider {provider!r}, expected one of {sorted(PROVIDER_PLUGINS)}"
+                )
+            # the default models are OpenAI's, so another provider needs its own model
+            if provider != "openai" and f"{kind}_model" not in data:
+                raise ValueError(
+                    f"{kind}_provider {provider!r} needs a matching {kind}_model"
+                )
+        return config
+
+
+def load_pipeline_config(path: Optional[pathlib.Path] = None) -> PipelineConfig:
+    path = path or settings.config_path("PIPELINE_CONFIG", DEFAULT_CONFIG_PATH)
+    return settings.load_config(PipelineConfig, path, "pipeline")
+
+
+def active_modes(config: PipelineConfig) -> set[str]:
+    """The pipeline modes rooms can be assigned to with this config."""
+    if config.mode:
+        return {config.mode}
+
+    modes = set()
+    if config.realtime_percentage > 0:
+        modes.add(REALTIME)
+    if config.realtime_percentage < 100:
+        modes.add(CASCADED)
+    return modes
+
+
+def required_plugins(config: PipelineConfig) -> list[str]:
+    modes = active_modes(config)
+    plugins = ["livekit.plugins.noise_cancellation"]
+    if REALTIME in modes:
+        plugins.append(PROVIDER_PLUGINS["openai"])
+    if CASCADED in modes:
+        plugins += [
+            "livekit.plugins.silero",
+            "livekit.plugins.turn_detector.multilingual",
+            PROVIDER_PLUGINS["openai"],
+            PROVIDER_PLUGINS[config.stt_provider],
+            PROVIDER_PLUGINS[config.tts_provider],
+        ]
+    return list(dict.fromkeys(plugins))
+
+
+def load_plugins(config: PipelineConfig) -> None:
+    """Imports only the plugins the configured pipeline uses.
+
+    livekit plugins register themselves when imported and must do so on the
+    main thread before the worker starts, so this has to run at module load
+    rather than lazily inside a job.
+    """
+    for module in required_plugins(config):
+        importlib.import_module(module)
+
+
+def select_mode(room_name: str, config: PipelineConfig) -> str:
+    """Assigns a room to a pipeline mode.
+
+    The assignment hashes the room name, so a room always lands in the same
+    bucket and roughly realtime_percentage of rooms get the realtime pipeline.
+    """
+    if config.mode:
+        return config.mode
+
+    bucket = int(hashlib.sha256(room_name.encode("utf-8")).hexdigest(), 16) % 10000
+    return REALTIME if bucket < config.realtime_percentage * 100 else CASCADED
+
+
+def models_names(mode: str, config: PipelineConfig) -> list[str]:
+    """The (llm, stt, tts) model triple, as used in recording filenames."""
+    if mode == REALTIME:
+        return [config.realtime_model, "realtime", config.realtime_voice]
+    return [config.llm_model, config.stt_model, config.tts_model]
+
+
+def _provider_plugin(provider: str):
+    # already imported by load_plugins when the worker started
+    if provider == "deepgram":
+        from livekit.plugins import deepgram
+
+        return deepgram
+    if provider == "cartesia":
+        from livekit.plugins import cartesia
+
+        return cartesia
+    return openai
+
+
+def build_session(
+    mode: str,
+    config: PipelineConfig,
+    vad,
+    endpointing_config: EndpointingConfig,
+) -> AgentSession:
+    if mode == REALTIME:
+        # The realtime model handles speech in and out and its own turn detection
+        # See all providers at https://docs.livekit.io/agents/integrations/realtime/
+        return AgentSession(
+            llm=openai.realtime.RealtimeModel(
+                model=config.realtime_model, voice=config.realtime_voice
+            ),
+        )
+
+    from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+    stt_plugin = _provider_plugin(config.stt_provider)
+    tts_plugin = _provider_plugin(config.tts_provider)
+    tts_options = {"voice": config.tts_voice} if config.tts_voice else {}
+
+    # Set up a voice AI pipeline using the configured providers and the LiveKit turn detector
+    return AgentSession(
+        # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
+        # See all providers at https://docs.livekit.io/agents/integrations/llm/
+        llm=openai.LLM(model=config.llm_model),
+        # llm=groq.LLM(
+        #     model="llama-3.1-8b-instant"
+        # ),
+        # llm=openai.LLM.with_ollama(
+        #     model="llama3.1",
+        #     base_url="http://localhost:11434/v1",
+        # ),
+        # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
+        # See all providers at https://docs.livekit.io/agents/integrations/stt/
+        # e.g. stt_provider "deepgram" with stt_model "nova-3"
+        stt=stt_plugin.STT(model=config.stt_model, language=config.stt_language),
+        # Text-to-speech (TTS) is your agent's voice, turning the LLM's text into speech that the user can hear
+        # See all providers at https://docs.livekit.io/agents/integrations/tts/
+        # e.g. tts_provider "cartesia" with tts_voice "6f84f4b8-58a2-430c-8c79-688dad597532"
+        tts=tts_plugin.TTS(model=config.tts_model, **tts_options),
+        # VAD and turn detection are used to determine when the user is speaking and when the agent should respond
+        # See more at https://docs.livekit.io/agents/build/turns
+        turn_detection=MultilingualModel(
+            unlikely_threshold=endpointing_config.unlikely_threshold
+        ),
+        vad=vad,
+        # endpointing delays, tuned offline with src/endpointing_benchmark.py
+        **endpointing_config.session_options(),
+        # allow the LLM to generate a response while waiting for the end of turn
+        # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
+        preemptive_generation=True,
+    )
+
+
+def estimate_cost(m: metrics.AgentMetrics, config: PipelineConfig) -> float:
+    """Estimated USD cost of a single metrics event, 0 for unpriced models."""
+    if isinstance(m, metrics.LLMMetrics):
+        price = MODEL_PRICES.get(config.llm_model)
+        if not price:
+            return 0.0
+        uncached = m.prompt_tokens - m.prompt_cached_tokens
+        return (
+            uncached * price["input"]
+            + m.prompt_cached_tokens * price["cached_input"]
+            + m.completion_tokens * price["output"]
+        ) / 1e6
+
+    if isinstance(m, metrics.RealtimeModelMetrics):
+        price = MODEL_PRICES.get(config.realtime_model)
+        if not price:
+            return 0.0
+        inputs, outputs = m.input_token_details, m.output_token_details
+        cached = inputs.cached_tokens_details
+        cached_text = cached.text_tokens if cached else 0
+        cached_audio = cached.audio_tokens if cached else 0
+        return (
+            (inputs.text_tokens - cached_text) * price["text_input"]
+            + (inputs.audio_tokens - cached_audio) * price["audio_input"]
+            + (cached_text + cached_audio) * price["cached_input"]
+            + outputs.text_tokens * price["text_output"]
+            + outputs.audio_tokens * price["audio_output"]
+        ) / 1e6
+
+    if isinstance(m, metrics.STTMetrics):
+        price = MODEL_PRICES.get(config.stt_model)
+        return price["minute"] * m.audio_duration / 60 if price else 0.0
+
+    if isinstance(m, metrics.TTSMetrics):
+        price = MODEL_PRICES.get(config.tts_model)
+        return price["minute"] * m.audio_duration / 60 if price else 0.0
+
+    return 0.0
+
+
+class PipelineMetrics:
+    """Per-turn latency and estimated cost, tagged with the pipeline mode.
+
+    Both pipelines measure a turn the same way: from the session's end of user
+    speech (the `user_state_changed` event to "listening", emitted by the local
+    VAD in cascaded mode and by the server VAD in realtime mode) to the agent's
+    first audio (`agent_state_changed` to "speaking"). A turn's cost is what was
+    billed from that end of speech until the next one, so it is reported when the
+    next turn starts or on `close`.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        config: PipelineConfig,
+        on_turn: Optional[Callable[[float, float], None]] = None,
+    ) -> None:
+        self.mode = mode
+        self._config = config
+        # called with (latency, cost) for every completed turn
+        self._on_turn = on_turn
+        self._user_stopped_at: Optional[float] = None
+        self._turn_latency: Optional[float] = None
+        self._turn_cost = 0.0
+        self.turn_latencies: list[float] = []
+        self.cost = 0.0
+
+    def collect(self, m: metrics.AgentMetrics) -> None:
+        cost = estimate_cost(m, self._config)
+        self.cost += cost
+        # the greeting, before the user's first turn, only counts towards the total
+        if self._user_stopped_at is not None:
+            self._turn_cost += cost
+
+    def user_state_changed(self, ev: UserStateChangedEvent) -> None:
+        if ev.old_state == "speaking" and ev.new_state == "listening":
+            # a turn the agent never answered (the user carried on speaking)
+            # folds its cost into the next one
+            self._finish_turn()
+            self._user_stopped_at = ev.created_at
+
+    def agent_state_changed(self, ev: AgentStateChangedEvent) -> None:
+        if (
+            ev.new_state == "speaking"
+            and self._user_stopped_at is not None
+            and self._turn_latency is None
+        ):
+            self._turn_latency = max(ev.created_at - self._user_stopped_at, 0.0)
+
+    def close(self) -> None:
+        self._finish_turn()
+        self._user_stopped_at = None
+
+    def _finish_turn(self) -> None:
+        if self._turn_latency is None:
+            return
+        latency, cost = self._turn_latency, self._turn_cost
+        self._turn_latency, self._turn_cost = None, 0.0
+
+        self.turn_latencies.append(latency)
+        if self._on_turn:
+            self._on_turn(latency, cost)
+        logger.info(
+            f"Turn latency {latency:.3f}s, cost ${cost:.5f}",
+            extra={
+                "pipeline_mode": self.mode,
+                "turn_latency": latency,
+                "turn_cost": cost,
+            },
+        )
+
+    def summary(self) -> dict:
+        latencies = sorted(self.turn_latencies)
+        return {
+            "pipeline_mode": self.mode,
+            "turns": len(latencies),
+            "median_latency": latencies[len(latencies) // 2] if latencies else None,
+            "max_latency": latencies[-1] if latencies else None,
+            "cost": round(self.cost, 5),
+        }
@@ -9,11 +9,37 @@ from livekit.api import StopEgressRequest
 
 logger = logging.getLogger("recording")
 
+
+def recording_enabled() -> bool:
+    return all(
+        os.getenv(name)
+        for name in ("LIVEKIT_URL", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET", "DO_SPACES_ENDPOINT", "DO_SPACES_BUCKET")
+    )
+
+
+def create_s3_client():
+    """Create the Digital Ocean Spaces client.
+
+    boto3 is slow to import, so call this from prewarm to keep it off the job's hot path.
+    """
+    import boto3
+    from botocore.client import Config
+
+    region = os.getenv("DO_SPACES_ENDPOINT", "").split('.')[0]
+    return boto3.client(
+        's3',
+        endpoint_url=f'https://{region}.digitaloceanspaces.com',
+        aws_access_key_id=os.getenv("DO_SPACES_KEY", ""),
+        aws_secret_access_key=os.getenv("DO_SPACES_SECRET", ""),
+        config=Config(signature_version='s3v4')
+    )
+
+
 class RecordingManager:
-    def __init__(self):
+    def __init__(self, s3_client=None):
         self._livekit_api: Optional[api.LiveKitAPI] = None
         self._current_recording_id: Optional[str] = None
-        self._s3_client = None
+        self._s3_client = s3_client
         self._init_livekit_api()
 
     def _init_livekit_api(self) -> None:
@@ -31,19 +57,10 @@ class RecordingManager:
             api_secret=api_secret
         )
 
-    async def _ensure_public_access(self, bucket_name: str, region: str) -> None:
+    async def _ensure_public_access(self, bucket_name: str) -> None:
         """Ensure the bucket has a public read policy"""
-        import boto3
-        from botocore.client import Config
-        
         if not self._s3_client:
-            self._s3_client = boto3.client(
-                's3',
-                endpoint_url=f'https://{region}.digitaloceanspaces.com',
-                aws_access_key_id=os.getenv("DO_SPACES_KEY", ""),
-                aws_secret_access_key=os.getenv("DO_SPACES_SECRET", ""),
-                config=Config(signature_version='s3v4')
-            )
+            self._s3_client = create_s3_client()
         
         # Define the bucket policy
         bucket_policy = {
@@ -81,7 +98,7 @@ class RecordingManager:
             region = endpoint.split('.')[0]
             
             # Ensure the bucket has public read access
-            await self._ensure_public_access(bucket_name, region)
+            await self._ensure_public_access(bucket_name)
 
             timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
             filename_prefix = f"{room_name}-{modelsNames[0]}_{modelsNames[1]}_{modelsNames[2]}-{timestamp}"
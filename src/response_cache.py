@@ -0,0 +1,329 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from livekit import rtc
+
+logger = logging.getLogger("response-cache")
+
+DEFAULT_DB_PATH = pathlib.Path("data") / "response_cache.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    content_hash TEXT NOT NULL,
+    context TEXT NOT NULL,
+    transcript TEXT NOT NULL,
+    text TEXT NOT NULL,
+    latency REAL NOT NULL,
+    embedding TEXT NOT NULL,
+    pcm BLOB NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    num_channels INTEGER NOT NULL,
+    samples_per_frame INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, context, transcript)
+);
+CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+"""
+
+INSERT_RESPONSE = """
+INSERT OR REPLACE INTO responses
+    (content_hash, context, transcript, text, latency, embedding,
+     pcm, sample_rate, num_channels, samples_per_frame, created_at, used_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Hebrew points and cantillation marks (niqqud), which STT output is inconsistent about
+# (the maqaf, U+05BE, is a hyphen and is left for _NON_WORD to split on)
+_NIQQUD = re.compile("[\u0591-\u05bd\u05bf-\u05c7]")
+_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def db_path() -> pathlib.Path:
+    return pathlib.Path(os.getenv("RESPONSE_CACHE_DB", str(DEFAULT_DB_PATH)))
+
+
+def normalize_transcript(text: str) -> str:
+    """Normalizes a Hebrew transcript so that trivially different phrasings share a key."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _NIQQUD.sub("", text).translate(_FINAL_LETTERS)
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def embed(text: str) -> dict[str, float]:
+    """Local, dependency free embedding: L2 normalized character trigram counts."""
+    padded = f" {text} "
+    counts: dict[str, float] = {}
+    for i in range(len(padded) - 2):
+        gram = padded[i : i + 3]
+        counts[gram] = counts.get(gram, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def similarity(a: dict[str, float], b: dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+def mentions_any(text: str, terms: Iterable[str]) -> bool:
+    """Whether `text` contains any of `terms` (e.g. the caller's name), after normalization."""
+    normalized = normalize_transcript(text)
+    return any(
+        len(term) > 1 and term in normalized
+        for term in map(normalize_transcript, terms)
+    )
+
+
+def content_hash(*parts: str) -> str:
+    """Hash of everything an answer depends on (instructions, knowledge, models)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    # synthesized audio frames (rtc.AudioFrame) for `text`
+    frames: list[rtc.AudioFrame]
+    # seconds from the start of generation to the first audio frame
+    latency: float
+
+
+def encode_frames(frames: list[rtc.AudioFrame]) -> tuple[bytes, int, int, int]:
+    """PCM of `frames` with its sample rate, channel count and samples per frame."""
+    first = frames[0]
+    pcm = b"".join(bytes(frame.data) for frame in frames)
+    return pcm, first.sample_rate, first.num_channels, first.samples_per_channel
+
+
+def decode_frames(
+    pcm: bytes, sample_rate: int, num_channels: int, samples_per_frame: int
+) -> list[rtc.AudioFrame]:
+    frame_bytes = samples_per_frame * num_channels * 2
+    frames = []
+    for offset in range(0, len(pcm), frame_bytes):
+        chunk = pcm[offset : offset + frame_bytes]
+        frames.append(
+            rtc.AudioFrame(
+                data=chunk,
+                sample_rate=sample_rate,
+                num_channels=num_channels,
+                samples_per_channel=len(chunk) // (num_channels * 2),
+            )
+        )
+    return frames
+
+
+@dataclass
+class PendingResponse:
+    """The reply being generated for `transcript`, shared by the agent's llm and tts nodes."""
+
+    transcript: str
+    # the assistant turn `transcript` answers, see ResponseCache.lookup
+    context: str
+    started_at: float
+    hit: Optional[CachedResponse] = None
+    text: str = ""
+    # set once the LLM finished without tool calls
+    complete: bool = False
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    latency_saved: float = 0.0
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved": round(self.latency_saved, 3),
+        }
+
+
+class ResponseCache:
+    """Answers to previously asked questions, with their synthesized audio.
+
+    livekit runs every job in its own process, so entries live in a SQLite
+    database (WAL mode, like the metrics store) shared by all jobs on the host.
+    They are keyed by the content hash (instructions, knowledge, models), so a
+    change in any of those starts from an empty cache, then by the normalized
+    transcript and the assistant turn it replies to, so "כן" after two
+    different questions are two different entries. Lookups match the
+    transcript exactly first, then by embedding similarity among entries with
+    the same content hash and context. Transcripts shorter than `min_chars` are
+    too context dependent to cache at all. Entries expire `ttl` seconds after
+    they are stored, and the least recently used ones are evicted past
+    `max_entries`.
+
+    `lookup` and `store` don't touch the stats, the caller records a hit or a
+    miss once the reply is actually played.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        *,
+        max_entries: int = 128,
+        ttl: float = 24 * 3600,
+        similarity_threshold: float = 0.9,
+        min_chars: int = 10,
+        embed_fnc: Callable[[str], dict[str, float]] = embed,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._similarity_threshold = similarity_threshold
+        self._min_chars = min_chars
+        self._embed = embed_fnc
+        self._clock = clock
+        self._content_hash = ""
+        self.stats = CacheStats()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """The cache is opt-in, enabled with RESPONSE_CACHE_ENABLED=1."""
+        if os.getenv("RESPONSE_CACHE_ENABLED", "").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            db_path(),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "128")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600))),
+            similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9")),
+            min_chars=int(os.getenv("RESPONSE_CACHE_MIN_CHARS", "10")),
+        )
+
+    def __len__(self) -> int:
+        """Number of unexpired entries for the current content hash."""
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM responses WHERE content_hash = ? AND created_at >= ?",
+                (self._content_hash, self._clock() - self._ttl),
+            ).fetchone()
+        return count
+
+    def set_content_hash(self, value: str) -> None:
+        self._content_hash = value
+
+    def accepts(self, transcript: str) -> bool:
+        return len(normalize_transcript(transcript)) >= self._min_chars
+
+    def lookup(self, transcript: str, context: str = "") -> Optional[CachedResponse]:
+        """`context` is the assistant turn the transcript replies to."""
+        if not self.accepts(transcript):
+            return None
+
+        context_key = content_hash(normalize_transcript(context))
+        key = normalize_transcript(transcript)
+        oldest = self._clock() - self._ttl
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT transcript, embedding FROM responses "
+                "WHERE content_hash = ? AND context = ? AND created_at >= ?",
+                (self._content_hash, context_key, oldest),
+            ).fetchall()
+
+        match = next((t for t, _ in candidates if t == key), None)
+        if match is None:
+            embedding = self._embed(key)
+            best_score = self._similarity_threshold
+            for candidate, candidate_embedding in candidates:
+                score = similarity(embedding, json.loads(candidate_embedding))
+                if score >= best_score:
+                    match, best_score = candidate, score
+            if match is None:
+                return None
+
+        row_key = (self._content_hash, context_key, match)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT text, latency, pcm, sample_rate, num_channels, samples_per_frame "
+                "FROM responses WHERE content_hash = ? AND context = ? AND transcript = ?",
+                row_key,
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET used_at = ? "
+                "WHERE content_hash = ? AND context = ? AND transcript = ?",
+                (self._clock(), *row_key),
+            )
+        text, latency, *audio = row
+        return CachedResponse(text=text, frames=decode_frames(*audio), latency=latency)
+
+    def store(
+        self,
+        transcript: str,
+        text: str,
+        frames: list[rtc.AudioFrame],
+        latency: float,
+        context: str = "",
+        private_terms: Iterable[str] = (),
+    ) -> None:
+        """Caches `text` unless it mentions any of `private_terms`, e.g. the caller's name."""
+        if not self.accepts(transcript) or not text or not frames:
+            return
+        if mentions_any(text, private_terms):
+            return
+
+        key = normalize_transcript(transcript)
+        now = self._clock()
+        row = (
+            self._content_hash,
+            content_hash(normalize_transcript(context)),
+            key,
+            text,
+            latency,
+            json.dumps(self._embed(key)),
+            *encode_frames(frames),
+            now,
+            now,
+        )
+        with self._lock, self._conn:
+            self._conn.execute(INSERT_RESPONSE, row)
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self._ttl,)
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid NOT IN "
+                "(SELECT rowid FROM responses ORDER BY used_at DESC LIMIT ?)",
+                (self._max_entries,),
+            )
+
+    def record_hit(self, latency_saved: float) -> None:
+        self.stats.hits += 1
+        self.stats.latency_saved += max(latency_saved, 0.0)
+
+    def record_miss(self) -> None:
+        self.stats.misses += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
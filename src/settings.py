@@ -0,0 +1,50 @@
+import json
+import logging
+import os
+import pathlib
+from dataclasses import fields
+from typing import TypeVar
+
+logger = logging.getLogger("settings")
+
+T = TypeVar("T")
+
+
+def config_path(env_var: str, default: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(os.getenv(env_var, str(default)))
+
+
+def dataclass_from_dict(cls: type[T], data: dict, name: str) -> T:
+    """Builds the config dataclass `cls` from `data`, ignoring unknown keys."""
+    known = {f.name for f in fields(cls)}
+    unknown = set(data) - known
+    if unknown:
+        logger.warning(f"Ignoring unknown {name} options: {sorted(unknown)}")
+    return cls(**{k: v for k, v in data.items() if k in known})
+
+
+def load_config(cls: type[T], path: pathlib.Path, name: str) -> T:
+    """Loads `cls` from a JSON file with its `from_dict`.
+
+    A missing or invalid file falls back to the defaults, so a bad config never
+    keeps the worker from starting.
+    """
+    if not path.exists():
+        return cls()
+
+    try:
+        with open(path, encoding="utf-8") as file:
+            config = cls.from_dict(json.load(file))
+        logger.info(f"Loaded {name} config from {path}: {config}")
+        return config
+    except Exception as e:
+        logger.error(f"Error loading {name} config {path}: {e}")
+        return cls()
+
+
+def save_config(config, path: pathlib.Path) -> pathlib.Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(config.to_dict(), file, indent=2)
+        file.write("\n")
+    return path
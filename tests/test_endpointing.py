@@ -0,0 +1,204 @@
+import json
+import pathlib
+import wave
+
+import numpy as np
+import pytest
+
+from endpointing import (
+    EndpointingConfig,
+    load_endpointing_config,
+    save_endpointing_config,
+)
+from endpointing_benchmark import (
+    BenchmarkResult,
+    Pause,
+    Replay,
+    Sample,
+    Word,
+    recommend,
+    run_benchmark,
+    score_replay,
+    turn_text,
+)
+
+
+def _sample() -> Sample:
+    # the user pauses mid-turn after "אני רוצה", finishes at 2.0 and speaks again at 5.0
+    return Sample(
+        audio=pathlib.Path("unused.wav"),
+        language="he",
+        words=[
+            Word("אני", 0.0, 0.3),
+            Word("רוצה", 0.3, 0.8),
+            Word("לשאול", 1.4, 2.0),
+            Word("תודה", 5.0, 5.5),
+        ],
+        turn_ends=[2.0, 5.5],
+    )
+
+
+def _replay(sample: Sample, mid_turn_probability: float) -> Replay:
+    def pause(start: float, end: float, probability=None) -> Pause:
+        return Pause(
+            speech_start=start,
+            speech_end=end,
+            vad_fired=end + 0.4,
+            text=turn_text(sample, end),
+            eou_probability=probability,
+            has_words=any(w.start < end and w.end > start for w in sample.words),
+        )
+
+    return Replay(
+        sample_index=0,
+        activation_threshold=0.5,
+        min_silence_duration=0.4,
+        pauses=[
+            pause(0.0, 0.8, mid_turn_probability),
+            pause(1.4, 2.0, 0.9),
+            # background noise while the agent answers
+            pause(3.0, 3.8),
+            pause(5.0, 5.5, 0.9),
+        ],
+        default_unlikely_threshold=0.1,
+    )
+
+
+def test_turn_text_is_scoped_to_current_turn() -> None:
+    sample = _sample()
+    assert turn_text(sample, 0.8) == "אני רוצה"
+    assert turn_text(sample, 2.0) == "אני רוצה לשאול"
+    assert turn_text(sample, 3.8) == ""
+    assert turn_text(sample, 5.5) == "תודה"
+
+
+def test_short_delay_cuts_off_mid_turn_pause() -> None:
+    sample = _sample()
+    config = EndpointingConfig(min_endpointing_delay=0.4, max_endpointing_delay=3.0)
+    result = BenchmarkResult(config=config)
+
+    # the turn detector thinks the user is done, so the 0.6s pause gets cut off
+    score_replay(sample, _replay(sample, mid_turn_probability=0.5), config, result)
+
+    assert result.premature == 1
+    assert result.turns == 2
+    assert result.missed == 0
+    assert result.latencies == pytest.approx([0.4, 0.4])
+    assert result.false_interruptions == 1
+
+
+def test_unlikely_end_of_turn_waits_for_max_delay() -> None:
+    sample = _sample()
+    config = EndpointingConfig(min_endpointing_delay=0.4, max_endpointing_delay=3.0)
+    result = BenchmarkResult(config=config)
+
+    score_replay(sample, _replay(sample, mid_turn_probability=0.01), config, result)
+
+    assert result.premature == 0
+    assert result.latencies == pytest.approx([0.4, 0.4])
+
+
+def test_recommend_prefers_lowest_latency_within_budget() -> None:
+    fast = BenchmarkResult(
+        config=EndpointingConfig(min_endpointing_delay=0.2),
+        turns=10,
+        latencies=[0.2] * 9,
+        premature=1,
+    )
+    safe = BenchmarkResult(
+        config=EndpointingConfig(min_endpointing_delay=0.6),
+        turns=10,
+        latencies=[0.6] * 10,
+    )
+
+    assert recommend([fast, safe], 0.05, 0.05, max_missed_rate=0.05) is safe
+    assert recommend([fast, safe], 0.2, 0.05, max_missed_rate=0.05) is fast
+
+
+def test_recommend_rejects_configs_that_miss_turns() -> None:
+    # answers only its fast turns, so its latencies alone look better
+    silent = BenchmarkResult(
+        config=EndpointingConfig(max_endpointing_delay=1.5),
+        turns=10,
+        latencies=[0.4] * 7,
+        missed=3,
+    )
+    safe = BenchmarkResult(
+        config=EndpointingConfig(max_endpointing_delay=6.0),
+        turns=10,
+        latencies=[0.4] * 7 + [3.0] * 3,
+    )
+
+    assert recommend([silent, safe], 0.05, 0.05, max_missed_rate=0.05) is safe
+
+
+def test_config_round_trip(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "endpointing.json"
+    assert load_endpointing_config(path) == EndpointingConfig()
+
+    config = EndpointingConfig(min_endpointing_delay=0.3, unlikely_threshold=0.05)
+    save_endpointing_config(config, path)
+
+    assert json.loads(path.read_text())["min_endpointing_delay"] == 0.3
+    assert load_endpointing_config(path) == config
+
+
+def _voiced(duration: float, f0: float, sample_rate: int) -> np.ndarray:
+    # harmonics shaped by vowel-like formants, enough for silero to call it speech
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    phase = (
+        2 * np.pi * np.cumsum(f0 * (1 + 0.1 * np.sin(2 * np.pi * 3 * t))) / sample_rate
+    )
+    signal = np.zeros_like(t)
+    for h in range(1, 30):
+        formants = sum(
+            np.exp(-((((h * f0) - f) / bw) ** 2))
+            for f, bw in ((700, 150), (1200, 200), (2600, 300))
+        )
+        signal += (formants + 0.05) / h * np.sin(h * phase)
+    envelope = np.sqrt(0.5 * (1 - np.cos(2 * np.pi * t / duration)))
+    signal *= envelope * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+    return 0.6 * signal / np.abs(signal).max()
+
+
+def test_run_benchmark_replays_audio_through_vad(tmp_path: pathlib.Path) -> None:
+    sample_rate = 16000
+    silence = np.zeros(int(0.5 * sample_rate))
+    audio = np.concatenate(
+        [
+            silence,
+            _voiced(1.0, 130, sample_rate),
+            silence,
+            silence,
+            silence,
+            _voiced(1.0, 170, sample_rate),
+            silence,
+            silence,
+        ]
+    )
+    path = tmp_path / "sample.wav"
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((audio * 32767).astype("<i2").tobytes())
+
+    # two single word turns, ending where the voiced segments fade out
+    sample = Sample(
+        audio=path,
+        language="he",
+        words=[Word("שלום", 0.6, 1.5), Word("תודה", 3.1, 4.0)],
+        turn_ends=[1.6, 4.1],
+    )
+    configs = [
+        EndpointingConfig(min_endpointing_delay=0.4),
+        EndpointingConfig(min_endpointing_delay=0.8),
+    ]
+
+    fast, slow = run_benchmark([sample], configs, workers=1, use_turn_detector=False)
+
+    assert (fast.turns, fast.missed, fast.premature) == (2, 0, 0)
+    assert len(fast.latencies) == 2
+    # the endpoint waits for the VAD's silence window, then the endpointing delay
+    assert all(0.3 < latency < 0.6 for latency in fast.latencies)
+    assert all(s > f + 0.3 for s, f in zip(slow.latencies, fast.latencies))
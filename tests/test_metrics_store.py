@@ -0,0 +1,137 @@
+import asyncio
+import pathlib
+import subprocess
+import sys
+from datetime import datetime
+from typing import Optional
+
+import pytest
+
+from metrics_report import LATENCY_SQL, build_report
+from metrics_store import MetricsStore, MetricsWriter, turn_row
+
+AGENT = pathlib.Path(__file__).resolve().parents[1] / "src" / "agent.py"
+
+STARTED_AT = datetime(2026, 10, 1, 12).timestamp()
+
+
+def _session(
+    session_id: str,
+    models: tuple[str, str, str],
+    cost: float,
+    recording_id: Optional[str] = "EG_1",
+    duration: float = 120,
+) -> tuple:
+    return (
+        session_id,
+        "room",
+        *models,
+        "cascaded",
+        recording_id,
+        STARTED_AT,
+        STARTED_AT + duration,
+        cost,
+    )
+
+
+def _llm_row(session_id: str, tokens: int) -> tuple:
+    return (session_id, "llm", STARTED_AT, 0.3, tokens, 0, 0.0, 0.0)
+
+
+@pytest.fixture
+def store(tmp_path: pathlib.Path):
+    store = MetricsStore(tmp_path / "metrics.db")
+    yield store
+    store.close()
+
+
+def test_store_uses_wal(store: MetricsStore) -> None:
+    assert store.query("PRAGMA journal_mode") == [("wal",)]
+
+
+async def test_writer_flushes_in_batches(store: MetricsStore) -> None:
+    models = ("gpt-4o-mini", "whisper-1", "gpt-4o-mini-tts")
+    writer = MetricsWriter(store, batch_size=3, flush_interval=60)
+    # written before the session ends, without a recording ID until it starts
+    await writer.start(_session("s1", models, 0.0, recording_id=None, duration=0))
+    assert store.query("SELECT id, recording_id FROM sessions") == [("s1", None)]
+    await writer.update_session(_session("s1", models, 0.0, duration=0))
+    assert store.query("SELECT id, recording_id FROM sessions") == [("s1", "EG_1")]
+
+    for latency in (1.0, 2.0):
+        writer.add(turn_row("s1", latency, 0.0))
+    writer.add(None)
+    await asyncio.sleep(0.05)
+    assert store.query("SELECT COUNT(*) FROM metrics") == [(0,)]
+
+    writer.add(turn_row("s1", 3.0, 0.0))
+    for _ in range(20):
+        await asyncio.sleep(0.05)
+        if store.query("SELECT COUNT(*) FROM metrics") == [(3,)]:
+            break
+    assert store.query("SELECT COUNT(*) FROM metrics") == [(3,)]
+
+    writer.add(turn_row("s1", 4.0, 0.0))
+    await writer.aclose(_session("s1", models, 0.01))
+    assert store.query("SELECT COUNT(*) FROM metrics") == [(4,)]
+    assert store.query("SELECT recording_id, cost FROM sessions") == [("EG_1", 0.01)]
+
+    # a late update doesn't undo the end of the session
+    await writer.update_session(_session("s1", models, 0.0, duration=0))
+    assert store.query("SELECT cost FROM sessions") == [(0.01,)]
+
+
+def test_report_per_model_triple(store: MetricsStore) -> None:
+    cascaded = ("gpt-4o-mini", "whisper-1", "gpt-4o-mini-tts")
+    realtime = ("gpt-realtime", "realtime", "marin")
+    store.insert_session(_session("a", cascaded, 0.02))
+    store.insert_session(_session("b", cascaded, 0.04))
+    store.insert_session(_session("c", realtime, 0.50))
+    # still running, or died before writing its end
+    store.insert_session(_session("d", cascaded, 0.0, recording_id=None, duration=0))
+    store.insert_metrics(
+        [turn_row("a", float(i), 0.0) for i in range(1, 11)]
+        + [_llm_row("a", 600), _llm_row("b", 600), turn_row("c", 0.5, 0.0)]
+        + [turn_row("d", 30.0, 0.0), _llm_row("d", 600)]
+    )
+
+    report = build_report(store, datetime(2026, 10, 1), datetime(2026, 10, 2))
+
+    by_models = {entry["models"]: entry for entry in report}
+    entry = by_models["gpt-4o-mini_whisper-1_gpt-4o-mini-tts"]
+    assert entry["sessions"] == 2
+    assert entry["turns"] == 10
+    assert entry["p50_latency"] == 5.0
+    assert entry["p90_latency"] == 9.0
+    assert entry["tokens_per_minute"] == pytest.approx(1200 / 4)
+    assert entry["cost_per_session"] == pytest.approx(0.03)
+    assert by_models["gpt-realtime_realtime_marin"]["p99_latency"] == 0.5
+
+    assert build_report(store, datetime(2026, 10, 2), datetime(2026, 10, 3)) == []
+
+
+def test_agent_report_subcommand(store: MetricsStore, tmp_path: pathlib.Path) -> None:
+    store.insert_session(_session("a", ("gpt-4o-mini", "whisper-1", "tts"), 0.02))
+    command = [sys.executable, "-X", "importtime", str(AGENT), "report"]
+    arguments = ["--since", "2026-10-01", "--until", "2026-10-02"]
+    result = subprocess.run(
+        [*command, *arguments, "--db", str(tmp_path / "metrics.db")],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert "gpt-4o-mini_whisper-1_tts" in result.stdout
+    # the report doesn't load the pipeline plugins
+    assert "livekit.plugins.silero" not in result.stderr
+
+
+def test_report_queries_use_indexes(store: MetricsStore) -> None:
+    sql = LATENCY_SQL.format(room_filter="", percentile_columns="MIN(latency)")
+    plan = " ".join(
+        str(row) for row in store.query(f"EXPLAIN QUERY PLAN {sql}", (0, 1))
+    )
+
+    assert "INDEX sessions_started_at" in plan
+    assert "COVERING INDEX metrics_session_kind" in plan
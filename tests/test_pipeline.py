@@ -0,0 +1,175 @@
+import json
+import pathlib
+
+import pytest
+from livekit.agents import AgentStateChangedEvent, UserStateChangedEvent, metrics
+
+from pipeline import (
+    CASCADED,
+    REALTIME,
+    PipelineConfig,
+    PipelineMetrics,
+    estimate_cost,
+    load_pipeline_config,
+    models_names,
+    required_plugins,
+    select_mode,
+)
+
+
+def test_select_mode_is_sticky_and_follows_percentage() -> None:
+    config = PipelineConfig(realtime_percentage=30)
+    rooms = [f"room-{i}" for i in range(2000)]
+
+    modes = [select_mode(room, config) for room in rooms]
+
+    assert modes == [select_mode(room, config) for room in rooms]
+    assert 0.25 < modes.count(REALTIME) / len(rooms) < 0.35
+    assert select_mode("room-1", PipelineConfig()) == CASCADED
+    assert select_mode("room-1", PipelineConfig(realtime_percentage=100)) == REALTIME
+    assert (
+        select_mode("room-1", PipelineConfig(realtime_percentage=100, mode=CASCADED))
+        == CASCADED
+    )
+
+
+def test_unknown_mode_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        PipelineConfig.from_dict({"mode": "s2s"})
+
+
+def test_provider_change_needs_a_matching_model() -> None:
+    with pytest.raises(ValueError):
+        PipelineConfig.from_dict({"stt_provider": "deepgram"})
+    with pytest.raises(ValueError):
+        PipelineConfig.from_dict({"tts_provider": "cartesia"})
+
+    config = PipelineConfig.from_dict(
+        {"stt_provider": "deepgram", "stt_model": "nova-3"}
+    )
+    assert (config.stt_provider, config.stt_model) == ("deepgram", "nova-3")
+
+
+def test_invalid_config_file_falls_back_to_defaults(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "pipeline.json"
+    path.write_text(json.dumps({"mode": "s2s"}))
+    assert load_pipeline_config(path) == PipelineConfig()
+
+    path.write_text(json.dumps({"realtime_percentage": 20, "colour": "blue"}))
+    assert load_pipeline_config(path) == PipelineConfig(realtime_percentage=20)
+
+
+def test_models_names_per_mode() -> None:
+    config = PipelineConfig()
+    assert models_names(CASCADED, config) == [
+        "gpt-4o-mini",
+        "whisper-1",
+        "gpt-4o-mini-tts",
+    ]
+    assert models_names(REALTIME, config) == ["gpt-realtime", "realtime", "marin"]
+
+
+def _llm_metrics(speech_id: str) -> metrics.LLMMetrics:
+    return metrics.LLMMetrics(
+        label="llm",
+        request_id="req",
+        timestamp=0,
+        duration=1.0,
+        ttft=0.3,
+        cancelled=False,
+        completion_tokens=1_000,
+        prompt_tokens=10_000,
+        prompt_cached_tokens=0,
+        total_tokens=11_000,
+        tokens_per_second=50,
+        speech_id=speech_id,
+    )
+
+
+def _user_state(old: str, new: str, at: float) -> UserStateChangedEvent:
+    return UserStateChangedEvent(old_state=old, new_state=new, created_at=at)
+
+
+def _agent_state(old: str, new: str, at: float) -> AgentStateChangedEvent:
+    return AgentStateChangedEvent(old_state=old, new_state=new, created_at=at)
+
+
+def test_turn_latency_runs_from_end_of_speech_to_first_audio() -> None:
+    turns = []
+    pipeline_metrics = PipelineMetrics(
+        CASCADED,
+        PipelineConfig(),
+        on_turn=lambda latency, cost: turns.append((latency, cost)),
+    )
+
+    # the greeting has no user turn before it
+    pipeline_metrics.agent_state_changed(_agent_state("thinking", "speaking", 1.0))
+    pipeline_metrics.collect(_llm_metrics("greeting"))
+
+    # the user pauses, the agent starts thinking, but the user carries on
+    pipeline_metrics.user_state_changed(_user_state("listening", "speaking", 2.0))
+    pipeline_metrics.user_state_changed(_user_state("speaking", "listening", 3.0))
+    pipeline_metrics.agent_state_changed(_agent_state("listening", "thinking", 3.1))
+    pipeline_metrics.collect(_llm_metrics("speech-1"))
+    pipeline_metrics.user_state_changed(_user_state("listening", "speaking", 3.5))
+    pipeline_metrics.user_state_changed(_user_state("speaking", "listening", 4.0))
+    pipeline_metrics.agent_state_changed(_agent_state("thinking", "speaking", 4.8))
+    pipeline_metrics.agent_state_changed(_agent_state("speaking", "thinking", 6.0))
+    pipeline_metrics.agent_state_changed(_agent_state("thinking", "speaking", 7.0))
+    pipeline_metrics.collect(_llm_metrics("speech-2"))
+    assert turns == []
+
+    pipeline_metrics.user_state_changed(_user_state("listening", "speaking", 9.0))
+    pipeline_metrics.user_state_changed(_user_state("speaking", "listening", 10.0))
+    assert turns == [(pytest.approx(0.8), pytest.approx(2 * 0.0021))]
+
+    pipeline_metrics.agent_state_changed(_agent_state("thinking", "speaking", 10.5))
+    pipeline_metrics.close()
+    assert [latency for latency, _ in turns] == pytest.approx([0.8, 0.5])
+    assert pipeline_metrics.cost == pytest.approx(3 * 0.0021)
+    assert pipeline_metrics.summary()["pipeline_mode"] == CASCADED
+
+
+def test_realtime_cost_splits_audio_and_text() -> None:
+    m = metrics.RealtimeModelMetrics(
+        label="realtime",
+        request_id="req",
+        timestamp=0,
+        duration=1.0,
+        ttft=0.4,
+        cancelled=False,
+        input_tokens=1_000_000,
+        output_tokens=1_000_000,
+        total_tokens=2_000_000,
+        tokens_per_second=50,
+        input_token_details=metrics.RealtimeModelMetrics.InputTokenDetails(
+            audio_tokens=500_000,
+            text_tokens=500_000,
+            image_tokens=0,
+            cached_tokens=0,
+            cached_tokens_details=None,
+        ),
+        output_token_details=metrics.RealtimeModelMetrics.OutputTokenDetails(
+            text_tokens=0, audio_tokens=1_000_000, image_tokens=0
+        ),
+    )
+
+    assert estimate_cost(m, PipelineConfig()) == pytest.approx(16 + 2 + 64)
+
+
+def test_required_plugins_follow_config() -> None:
+    cascaded = required_plugins(PipelineConfig())
+    assert "livekit.plugins.silero" in cascaded
+    assert "livekit.plugins.cartesia" not in cascaded
+    assert "livekit.plugins.deepgram" not in cascaded
+
+    realtime = required_plugins(PipelineConfig(mode=REALTIME))
+    assert "livekit.plugins.openai" in realtime
+    assert "livekit.plugins.silero" not in realtime
+    assert "livekit.plugins.turn_detector.multilingual" not in realtime
+
+    mixed = required_plugins(
+        PipelineConfig(realtime_percentage=10, tts_provider="cartesia")
+    )
+    assert "livekit.plugins.cartesia" in mixed
+    assert "livekit.plugins.silero" in mixed
@@ -0,0 +1,284 @@
+import pathlib
+
+import pytest
+from livekit import rtc
+from livekit.agents import Agent, ChatContext
+
+import agent as agent_module
+from agent import Assistant
+from response_cache import ResponseCache, normalize_transcript
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def cache_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    return tmp_path / "response_cache.db"
+
+
+def _frame(text: str) -> rtc.AudioFrame:
+    data = text.encode("utf-8")
+    data += b"\0" * (len(data) % 2)
+    return rtc.AudioFrame(
+        data=data, sample_rate=24000, num_channels=1, samples_per_channel=len(data) // 2
+    )
+
+
+def _pcm(frames: list[rtc.AudioFrame]) -> bytes:
+    return b"".join(bytes(frame.data) for frame in frames)
+
+
+def test_normalize_strips_niqqud_punctuation_and_final_letters() -> None:
+    assert normalize_transcript("מָה הָאַסְטְרָטֶגְיָה שֶׁלְּךָ?") == "מה האסטרטגיה שלכ"
+    assert normalize_transcript("  מה   האסטרטגיה שלך  ") == "מה האסטרטגיה שלכ"
+
+
+def test_exact_and_similar_hits(cache_path: pathlib.Path) -> None:
+    cache = ResponseCache(cache_path, similarity_threshold=0.85)
+    cache.store("מה האסטרטגיה שלך?", "תשובה", [_frame("audio")], latency=1.5)
+
+    assert cache.lookup("מָה הָאַסְטְרָטֶגְיָה שֶׁלְּךָ") is not None
+    assert cache.lookup("מה האסטרטגיה שלכם") is not None
+    assert cache.lookup("מה השעה עכשיו") is None
+
+
+def test_short_transcripts_are_not_cached(cache_path: pathlib.Path) -> None:
+    cache = ResponseCache(cache_path)
+    cache.store(
+        "כן", "תשובה", [_frame("audio")], latency=1.0, context="רוצה לשמוע עוד?"
+    )
+    assert len(cache) == 0
+    assert cache.lookup("כן", context="רוצה לשמוע עוד?") is None
+
+
+def test_replies_are_keyed_by_the_question_they_answer(
+    cache_path: pathlib.Path,
+) -> None:
+    cache = ResponseCache(cache_path, min_chars=0)
+    cache.store(
+        "כן", "הנה עוד פרטים", [_frame("audio")], latency=1.0, context="רוצה לשמוע עוד?"
+    )
+
+    assert cache.lookup("כן", context="לסיים את השיחה?") is None
+    assert cache.lookup("כן", context="") is None
+    assert cache.lookup("כן", context="רוצה לשמוע עוד?") is not None
+
+
+def test_replies_mentioning_the_user_are_not_cached(cache_path: pathlib.Path) -> None:
+    cache = ResponseCache(cache_path)
+    cache.store(
+        "מה האסטרטגיה שלך?",
+        "דני, האסטרטגיה היא סבלנות",
+        [_frame("audio")],
+        latency=1.0,
+        private_terms={"דני"},
+    )
+    assert len(cache) == 0
+
+
+def test_ttl_and_lru_eviction(cache_path: pathlib.Path) -> None:
+    clock = _Clock()
+    cache = ResponseCache(cache_path, max_entries=2, ttl=60, clock=clock)
+    cache.store("שאלה ראשונה", "א", [_frame("audio")], latency=1.0)
+    clock.now += 1
+    cache.store("שאלה שנייה", "ב", [_frame("audio")], latency=1.0)
+    clock.now += 1
+    assert cache.lookup("שאלה ראשונה") is not None
+
+    clock.now += 1
+    cache.store("שאלה שלישית לגמרי", "ג", [_frame("audio")], latency=1.0)
+    assert len(cache) == 2
+    assert cache.lookup("שאלה שנייה") is None
+
+    clock.now += 61
+    assert cache.lookup("שאלה ראשונה") is None
+    assert len(cache) == 0
+
+
+def test_entries_outlive_the_job(cache_path: pathlib.Path) -> None:
+    # every job runs in its own process, with its own ResponseCache
+    first_job = ResponseCache(cache_path)
+    first_job.set_content_hash("v1")
+    frames = [_frame("audio frame one"), _frame("audio frame two")]
+    first_job.store("מה האסטרטגיה שלך?", "תשובה", frames, latency=1.5)
+    first_job.close()
+
+    second_job = ResponseCache(cache_path)
+    second_job.set_content_hash("v1")
+    hit = second_job.lookup("מה האסטרטגיה שלך")
+    assert hit.text == "תשובה"
+    assert hit.latency == 1.5
+    assert _pcm(hit.frames) == _pcm(frames)
+    assert all(frame.sample_rate == 24000 for frame in hit.frames)
+
+
+def test_content_change_invalidates(cache_path: pathlib.Path) -> None:
+    cache = ResponseCache(cache_path)
+    cache.set_content_hash("v1")
+    cache.store("מה האסטרטגיה שלך?", "תשובה", [_frame("audio")], latency=1.0)
+
+    cache.set_content_hash("v2")
+    assert len(cache) == 0
+    assert cache.lookup("מה האסטרטגיה שלך?") is None
+    cache.set_content_hash("v1")
+    assert len(cache) == 1
+
+
+async def test_assistant_replays_cached_answer(
+    monkeypatch, cache_path: pathlib.Path
+) -> None:
+    calls = {"llm": 0, "tts": 0}
+
+    async def fake_llm_node(agent, chat_ctx, tools, model_settings):
+        calls["llm"] += 1
+        yield "האסטרטגיה "
+        yield "היא סבלנות"
+
+    async def fake_tts_node(agent, text, model_settings):
+        calls["tts"] += 1
+        async for chunk in text:
+            yield _frame(f"audio:{chunk}")
+
+    monkeypatch.setattr(Agent.default, "llm_node", fake_llm_node)
+    monkeypatch.setattr(Agent.default, "tts_node", fake_tts_node)
+
+    cache = ResponseCache(cache_path)
+    assistant = Assistant(chat_ctx=ChatContext(), instructions="", response_cache=cache)
+
+    async def reply(question: str) -> tuple[list, list]:
+        chat_ctx = ChatContext()
+        chat_ctx.add_message(role="user", content=question)
+        text = [chunk async for chunk in assistant.llm_node(chat_ctx, [], None)]
+
+        async def text_stream():
+            for chunk in text:
+                yield chunk
+
+        frames = [frame async for frame in assistant.tts_node(text_stream(), None)]
+        return text, frames
+
+    first_text, first_frames = await reply("מה האסטרטגיה?")
+    second_text, second_frames = await reply("מה האסטרטגיה")
+
+    assert calls == {"llm": 1, "tts": 1}
+    assert "".join(second_text) == "".join(first_text)
+    assert _pcm(second_frames) == _pcm(first_frames)
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+async def test_first_question_hits_across_callers_with_different_greetings(
+    monkeypatch, cache_path: pathlib.Path
+) -> None:
+    calls = {"llm": 0}
+
+    async def fake_llm_node(agent, chat_ctx, tools, model_settings):
+        calls["llm"] += 1
+        yield "האסטרטגיה היא סבלנות"
+
+    async def fake_tts_node(agent, text, model_settings):
+        async for chunk in text:
+            yield _frame(f"audio:{chunk}")
+
+    monkeypatch.setattr(Agent.default, "llm_node", fake_llm_node)
+    monkeypatch.setattr(Agent.default, "tts_node", fake_tts_node)
+
+    async def first_question(greeting: str) -> ResponseCache:
+        # a separate job, with its own cache on the shared database
+        cache = ResponseCache(cache_path)
+        assistant = Assistant(
+            chat_ctx=ChatContext(), instructions="", response_cache=cache
+        )
+        chat_ctx = ChatContext()
+        chat_ctx.add_message(role="assistant", content="מידע על החברה")
+        chat_ctx.add_message(role="assistant", content=greeting)
+        chat_ctx.add_message(role="user", content="מה האסטרטגיה שלכם?")
+        text = [chunk async for chunk in assistant.llm_node(chat_ctx, [], None)]
+
+        async def text_stream():
+            for chunk in text:
+                yield chunk
+
+        [frame async for frame in assistant.tts_node(text_stream(), None)]
+        return cache
+
+    first = await first_question("שלום דני, במה אפשר לעזור?")
+    second = await first_question("שלום רותי, במה אפשר לעזור?")
+
+    assert calls == {"llm": 1}
+    assert (first.stats.hits, first.stats.misses) == (0, 1)
+    assert (second.stats.hits, second.stats.misses) == (1, 0)
+
+
+class _SpeechHandle:
+    def __init__(self) -> None:
+        self.scheduled = False
+        self.interrupted = False
+        self._callbacks = []
+
+    def done(self) -> bool:
+        return False
+
+    def add_done_callback(self, callback) -> None:
+        self._callbacks.append(callback)
+
+    def play(self) -> None:
+        self.scheduled = True
+        for callback in self._callbacks:
+            callback(self)
+
+
+async def test_overlapping_generations_and_discarded_preemptive_reply(
+    monkeypatch, cache_path: pathlib.Path
+) -> None:
+    async def fake_llm_node(agent, chat_ctx, tools, model_settings):
+        yield f"תשובה ל{agent_module.last_user_message(chat_ctx)}"
+
+    async def fake_tts_node(agent, text, model_settings):
+        async for chunk in text:
+            yield _frame(f"audio:{chunk}")
+
+    monkeypatch.setattr(Agent.default, "llm_node", fake_llm_node)
+    monkeypatch.setattr(Agent.default, "tts_node", fake_tts_node)
+
+    cache = ResponseCache(cache_path)
+    assistant = Assistant(chat_ctx=ChatContext(), instructions="", response_cache=cache)
+    handles = {"preemptive": _SpeechHandle(), "final": _SpeechHandle()}
+    current = {}
+    monkeypatch.setattr(
+        agent_module, "current_speech_handle", lambda: handles[current["name"]]
+    )
+
+    async def generate(name: str, question: str) -> list[str]:
+        current["name"] = name
+        chat_ctx = ChatContext()
+        chat_ctx.add_message(role="user", content=question)
+        return [chunk async for chunk in assistant.llm_node(chat_ctx, [], None)]
+
+    async def synthesize(name: str, text: list[str]) -> list:
+        current["name"] = name
+
+        async def text_stream():
+            for chunk in text:
+                yield chunk
+
+        return [frame async for frame in assistant.tts_node(text_stream(), None)]
+
+    # the preemptive generation for a partial transcript overlaps the final one
+    preemptive_text = await generate("preemptive", "מה האסטרטגיה")
+    final_text = await generate("final", "מה האסטרטגיה שלכם בשוק")
+    await synthesize("final", final_text)
+    await synthesize("preemptive", preemptive_text)
+
+    handles["final"].play()
+
+    assert (cache.stats.hits, cache.stats.misses) == (0, 1)
+    assert cache.lookup("מה האסטרטגיה") is None
+    assert (
+        cache.lookup("מה האסטרטגיה שלכם בשוק").text == "תשובה למה האסטרטגיה שלכם בשוק"
+    )
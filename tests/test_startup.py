@@ -0,0 +1,69 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from pipeline import PipelineConfig, required_plugins
+
+SRC = pathlib.Path(__file__).resolve().parents[1] / "src"
+
+# Milliseconds a worker may spend importing what src/agent.py adds on top of
+# livekit.agents and the configured plugins. The agent's own modules measured
+# 21-28ms, so this catches a new heavy dependency (boto3 alone is ~10x that)
+# without depending on how fast livekit itself imports on the machine.
+IMPORT_OVERHEAD_BUDGET = float(os.getenv("IMPORT_OVERHEAD_BUDGET", "50"))
+
+
+def _import_times(code: str, cwd: pathlib.Path) -> dict[str, int]:
+    """Self import time in microseconds per module, from `python -X importtime`."""
+    env = {**os.environ, "PYTHONPATH": str(SRC)}
+    env.pop("PIPELINE_CONFIG", None)
+    command = [sys.executable, "-X", "importtime", "-c", code]
+
+    # the first run compiles bytecode, which a deployed worker already has
+    subprocess.run(command, cwd=cwd, env=env, capture_output=True, check=True)
+    result = subprocess.run(
+        command, cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line.split("|")
+        times[name.strip()] = int(own.split(":")[1])
+    return times
+
+
+@pytest.fixture(scope="module")
+def worker_dir(tmp_path_factory: pytest.TempPathFactory) -> pathlib.Path:
+    # run from an empty directory so the default pipeline config is used
+    return tmp_path_factory.mktemp("worker")
+
+
+@pytest.fixture(scope="module")
+def import_times(worker_dir: pathlib.Path) -> dict[str, int]:
+    return _import_times("import agent", worker_dir)
+
+
+def test_agent_import_overhead_within_budget(
+    import_times: dict[str, int], worker_dir: pathlib.Path
+) -> None:
+    baseline = ["dotenv", "livekit.agents", *required_plugins(PipelineConfig())]
+    baseline_times = _import_times(f"import {', '.join(baseline)}", worker_dir)
+
+    extra = {k: v for k, v in import_times.items() if k not in baseline_times}
+    milliseconds = sum(extra.values()) / 1e3
+    slowest = sorted(extra, key=extra.get, reverse=True)[:5]
+    assert milliseconds <= IMPORT_OVERHEAD_BUDGET, (
+        f"agent adds {milliseconds:.0f}ms of imports, budget is "
+        f"{IMPORT_OVERHEAD_BUDGET:.0f}ms (slowest: {slowest})"
+    )
+
+
+def test_unselected_plugins_are_not_imported(import_times: dict[str, int]) -> None:
+    assert "livekit.plugins.cartesia" not in import_times
+    assert "livekit.plugins.deepgram" not in import_times
+    assert "boto3" not in import_times